@@ -1,89 +1,100 @@
-from typing import List, Dict, Any
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+from typing import AsyncIterator, List, Dict, Any, Optional
+from langchain_core.language_models import BaseChatModel
+from src.core.llm_clients import acomplete, astream_completion, chat_prompt, complete, get_chat_llm
+
+ALTERNATIVES_SYSTEM_PROMPT = """You are an experienced clinician reviewing a case. Based on the symptoms and primary diagnosis you are given, generate alternative explanations.
+
+For each alternative explanation, provide:
+1. Alternative condition or cause
+2. How it explains the symptoms
+3. Supporting evidence
+4. Why it might be considered
+5. How to differentiate from primary diagnosis"""
+
+EVALUATION_SYSTEM_PROMPT = """You are an experienced clinician reviewing a case. Evaluate the alternative explanations you are given.
+
+For each alternative, provide:
+1. Likelihood assessment
+2. Clinical significance
+3. Impact on treatment approach
+4. Additional considerations"""
+
+SUMMARY_SYSTEM_PROMPT = """You are an experienced clinician reviewing a case. Provide a concise summary of the evaluated alternative explanations you are given.
+
+Focus on the most significant alternatives and their implications."""
 
 class AlternativeExplanationGenerator:
-    def __init__(self, openai_api_key: str):
-        self.llm = ChatOpenAI(temperature=0, model="gpt-4", openai_api_key=openai_api_key)
-        
+    def __init__(self, openai_api_key: str, model: str = "gpt-4o", llm: Optional[BaseChatModel] = None):
+        self.llm = llm or get_chat_llm(openai_api_key, model)
+
+        self._alternatives_template = chat_prompt(
+            ALTERNATIVES_SYSTEM_PROMPT,
+            "Symptoms: {symptoms}\n\nPrimary Diagnosis:\n{primary_diagnosis}"
+        )
+        self._evaluation_template = chat_prompt(EVALUATION_SYSTEM_PROMPT, "{alternatives}")
+        self._summary_template = chat_prompt(SUMMARY_SYSTEM_PROMPT, "{evaluated_alternatives}")
+
     def generate_alternatives(self, symptoms: List[str], primary_diagnosis: Dict[str, Any]) -> Dict[str, Any]:
         """Generate alternative explanations for the symptoms"""
-        
-        prompt = PromptTemplate(
-            input_variables=["symptoms", "primary_diagnosis"],
-            template="""
-            Based on the following symptoms and primary diagnosis, generate alternative explanations:
-            
-            Symptoms: {symptoms}
-            
-            Primary Diagnosis:
-            {primary_diagnosis}
-            
-            For each alternative explanation, provide:
-            1. Alternative condition or cause
-            2. How it explains the symptoms
-            3. Supporting evidence
-            4. Why it might be considered
-            5. How to differentiate from primary diagnosis
-            """
+        response = complete(
+            self.llm, self._alternatives_template, symptoms=symptoms, primary_diagnosis=primary_diagnosis
         )
-        
-        response = self.llm.predict(
-            prompt.format(
-                symptoms=symptoms,
-                primary_diagnosis=primary_diagnosis
-            )
+
+        return {
+            "symptoms": symptoms,
+            "primary_diagnosis": primary_diagnosis,
+            "alternative_explanations": response
+        }
+
+    async def agenerate_alternatives(self, symptoms: List[str], primary_diagnosis: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of generate_alternatives"""
+        response = await acomplete(
+            self.llm, self._alternatives_template, symptoms=symptoms, primary_diagnosis=primary_diagnosis
         )
-        
+
         return {
             "symptoms": symptoms,
             "primary_diagnosis": primary_diagnosis,
             "alternative_explanations": response
         }
-    
+
     def evaluate_alternatives(self, alternatives: Dict[str, Any]) -> Dict[str, Any]:
         """Evaluate the likelihood and implications of alternative explanations"""
-        prompt = PromptTemplate(
-            input_variables=["alternatives"],
-            template="""
-            Evaluate the following alternative explanations:
-            
-            {alternatives}
-            
-            For each alternative, provide:
-            1. Likelihood assessment
-            2. Clinical significance
-            3. Impact on treatment approach
-            4. Additional considerations
-            """
+        evaluation = complete(
+            self.llm, self._evaluation_template, alternatives=alternatives["alternative_explanations"]
         )
-        
-        evaluation = self.llm.predict(
-            prompt.format(
-                alternatives=alternatives["alternative_explanations"]
-            )
+
+        return {
+            "original_alternatives": alternatives,
+            "evaluation": evaluation
+        }
+
+    async def aevaluate_alternatives(self, alternatives: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of evaluate_alternatives"""
+        evaluation = await acomplete(
+            self.llm, self._evaluation_template, alternatives=alternatives["alternative_explanations"]
         )
-        
+
         return {
             "original_alternatives": alternatives,
             "evaluation": evaluation
         }
-    
+
     def get_alternative_summary(self, evaluated_alternatives: Dict[str, Any]) -> str:
         """Generate a concise summary of the alternative explanations"""
-        prompt = PromptTemplate(
-            input_variables=["evaluated_alternatives"],
-            template="""
-            Provide a concise summary of the following evaluated alternative explanations:
-            
-            {evaluated_alternatives}
-            
-            Focus on the most significant alternatives and their implications.
-            """
+        return complete(
+            self.llm, self._summary_template, evaluated_alternatives=evaluated_alternatives["evaluation"]
         )
-        
-        return self.llm.predict(
-            prompt.format(
-                evaluated_alternatives=evaluated_alternatives["evaluation"]
-            )
-        ) 
\ No newline at end of file
+
+    async def aget_alternative_summary(self, evaluated_alternatives: Dict[str, Any]) -> str:
+        """Async variant of get_alternative_summary"""
+        return await acomplete(
+            self.llm, self._summary_template, evaluated_alternatives=evaluated_alternatives["evaluation"]
+        )
+
+    async def astream_alternative_summary(self, evaluated_alternatives: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream the alternatives summary token by token as it is generated"""
+        async for token in astream_completion(
+            self.llm, self._summary_template, evaluated_alternatives=evaluated_alternatives["evaluation"]
+        ):
+            yield token
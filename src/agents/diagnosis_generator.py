@@ -1,89 +1,153 @@
-from typing import List, Dict, Any
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+from typing import AsyncIterator, List, Dict, Any, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import JsonOutputParser
+from src.core.llm_clients import acomplete, astream_completion, chat_prompt, complete, get_chat_llm
+
+DIAGNOSES_SYSTEM_PROMPT = """You are an experienced diagnostician. Based on the symptoms and medical context you are given, generate potential diagnoses.
+
+For each potential diagnosis, provide:
+1. Condition name
+2. Confidence level (High/Medium/Low)
+3. Key supporting symptoms
+4. Differential diagnosis considerations
+5. Recommended diagnostic tests
+6. Treatment options"""
+
+BUNDLE_SYSTEM_PROMPT = """You are an experienced diagnostician. Based on the symptoms and medical context you are given, diagnose the case, consider alternative explanations and critically evaluate your own assessment.
+
+Respond with a single JSON object with exactly these keys:
+- "potential_diagnoses": for each potential diagnosis, the condition name, confidence level (High/Medium/Low),
+  key supporting symptoms, differential diagnosis considerations, recommended diagnostic tests and treatment options
+- "alternative_explanations": for each alternative, the condition or cause, how it explains the symptoms,
+  supporting evidence, why it might be considered and how to differentiate it from the primary diagnosis
+- "evaluation": diagnosis quality (completeness, evidence-based reasoning, clinical relevance),
+  review of the alternative explanations (coverage, differential diagnosis quality) and an overall
+  assessment (confidence, areas of uncertainty, recommendations for improvement)"""
+
+RANK_SYSTEM_PROMPT = """You are an experienced diagnostician. Rank the potential diagnoses you are given by confidence and severity.
+
+Provide a ranked list with:
+1. Primary diagnosis (highest confidence)
+2. Secondary diagnoses
+3. Differential diagnoses to consider"""
+
+SUMMARY_SYSTEM_PROMPT = """You are an experienced diagnostician. Provide a concise summary of the ranked diagnoses you are given.
+
+Focus on the most likely diagnosis and key considerations."""
 
 class DiagnosisGenerator:
-    def __init__(self, openai_api_key: str):
-        self.llm = ChatOpenAI(temperature=0, model="gpt-4", openai_api_key=openai_api_key)
-        
-    def generate_diagnoses(self, symptoms: List[str], medical_context: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate potential diagnoses based on symptoms and medical context"""
-        
-        prompt = PromptTemplate(
-            input_variables=["symptoms", "medical_context"],
-            template="""
-            Based on the following symptoms and medical context, generate potential diagnoses:
-            
-            Symptoms: {symptoms}
-            
-            Medical Context:
-            {medical_context}
-            
-            For each potential diagnosis, provide:
-            1. Condition name
-            2. Confidence level (High/Medium/Low)
-            3. Key supporting symptoms
-            4. Differential diagnosis considerations
-            5. Recommended diagnostic tests
-            6. Treatment options
-            """
+    def __init__(self, openai_api_key: str, model: str = "gpt-4o", llm: Optional[BaseChatModel] = None):
+        self.llm = llm or get_chat_llm(openai_api_key, model)
+        # The fused call is parsed as JSON, so ask the model for a JSON object outright
+        self._json_llm = self.llm.bind(response_format={"type": "json_object"})
+
+        self._diagnoses_template = chat_prompt(
+            DIAGNOSES_SYSTEM_PROMPT, "Symptoms: {symptoms}\n\nMedical Context:\n{medical_context}"
         )
-        
-        response = self.llm.predict(
-            prompt.format(
-                symptoms=symptoms,
-                medical_context=medical_context
-            )
+        self._bundle_template = chat_prompt(
+            BUNDLE_SYSTEM_PROMPT, "Symptoms: {symptoms}\n\nMedical Context:\n{medical_context}"
         )
-        
+        self._rank_template = chat_prompt(RANK_SYSTEM_PROMPT, "{diagnoses}")
+        self._summary_template = chat_prompt(SUMMARY_SYSTEM_PROMPT, "{ranked_diagnoses}")
+
+    def generate_diagnoses(self, symptoms: List[str], medical_context: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate potential diagnoses based on symptoms and medical context"""
+        response = complete(self.llm, self._diagnoses_template, symptoms=symptoms, medical_context=medical_context)
+
+        return {
+            "symptoms": symptoms,
+            "medical_context": medical_context,
+            "potential_diagnoses": response
+        }
+
+    async def agenerate_diagnoses(self, symptoms: List[str], medical_context: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of generate_diagnoses"""
+        response = await acomplete(self.llm, self._diagnoses_template, symptoms=symptoms, medical_context=medical_context)
+
         return {
             "symptoms": symptoms,
             "medical_context": medical_context,
             "potential_diagnoses": response
         }
-    
+
+    def generate_bundle(self, symptoms: List[str], medical_context: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate diagnoses, alternative explanations and their evaluation in a single LLM call"""
+        response = complete(self._json_llm, self._bundle_template, symptoms=symptoms, medical_context=medical_context)
+
+        return self._build_bundle(symptoms, medical_context, response)
+
+    async def agenerate_bundle(self, symptoms: List[str], medical_context: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of generate_bundle"""
+        response = await acomplete(self._json_llm, self._bundle_template, symptoms=symptoms, medical_context=medical_context)
+
+        return self._build_bundle(symptoms, medical_context, response)
+
+    def _build_bundle(self, symptoms: List[str], medical_context: Dict[str, Any], response: str) -> Dict[str, Any]:
+        """Split the fused JSON response into the shapes the separate agents return"""
+        error = None
+        try:
+            bundle = JsonOutputParser().parse(response)
+            if not isinstance(bundle, dict):
+                raise OutputParserException(f"Expected a JSON object, got {type(bundle).__name__}")
+        except OutputParserException as e:
+            # Keep the raw text as the diagnosis so the downstream nodes still have something to work with
+            error = str(e)
+            bundle = {"potential_diagnoses": response}
+
+        diagnosis = {
+            "symptoms": symptoms,
+            "medical_context": medical_context,
+            "potential_diagnoses": bundle.get("potential_diagnoses", "")
+        }
+        if error is not None:
+            diagnosis.update({"status": "error", "error": error})
+        alternatives = {
+            "symptoms": symptoms,
+            "primary_diagnosis": diagnosis,
+            "alternative_explanations": bundle.get("alternative_explanations", "")
+        }
+        return {
+            "diagnosis": diagnosis,
+            "alternatives": alternatives,
+            "evaluation": {
+                "symptoms": symptoms,
+                "medical_context": medical_context,
+                "diagnosis": diagnosis,
+                "alternatives": alternatives,
+                "evaluation": bundle.get("evaluation", "")
+            }
+        }
+
     def rank_diagnoses(self, diagnoses: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Rank the potential diagnoses by confidence and severity"""
-        prompt = PromptTemplate(
-            input_variables=["diagnoses"],
-            template="""
-            Rank the following potential diagnoses by confidence and severity:
-            
-            {diagnoses}
-            
-            Provide a ranked list with:
-            1. Primary diagnosis (highest confidence)
-            2. Secondary diagnoses
-            3. Differential diagnoses to consider
-            """
-        )
-        
-        ranked_diagnoses = self.llm.predict(
-            prompt.format(
-                diagnoses=diagnoses["potential_diagnoses"]
-            )
-        )
-        
+        ranked_diagnoses = complete(self.llm, self._rank_template, diagnoses=diagnoses["potential_diagnoses"])
+
+        return {
+            "original_diagnoses": diagnoses,
+            "ranked_diagnoses": ranked_diagnoses
+        }
+
+    async def arank_diagnoses(self, diagnoses: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Async variant of rank_diagnoses"""
+        ranked_diagnoses = await acomplete(self.llm, self._rank_template, diagnoses=diagnoses["potential_diagnoses"])
+
         return {
             "original_diagnoses": diagnoses,
             "ranked_diagnoses": ranked_diagnoses
         }
-    
+
     def get_diagnosis_summary(self, ranked_diagnoses: Dict[str, Any]) -> str:
         """Generate a concise summary of the diagnoses"""
-        prompt = PromptTemplate(
-            input_variables=["ranked_diagnoses"],
-            template="""
-            Provide a concise summary of the following ranked diagnoses:
-            
-            {ranked_diagnoses}
-            
-            Focus on the most likely diagnosis and key considerations.
-            """
-        )
-        
-        return self.llm.predict(
-            prompt.format(
-                ranked_diagnoses=ranked_diagnoses["ranked_diagnoses"]
-            )
-        ) 
\ No newline at end of file
+        return complete(self.llm, self._summary_template, ranked_diagnoses=ranked_diagnoses["ranked_diagnoses"])
+
+    async def aget_diagnosis_summary(self, ranked_diagnoses: Dict[str, Any]) -> str:
+        """Async variant of get_diagnosis_summary"""
+        return await acomplete(self.llm, self._summary_template, ranked_diagnoses=ranked_diagnoses["ranked_diagnoses"])
+
+    async def astream_diagnosis_summary(self, ranked_diagnoses: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream the diagnosis summary token by token as it is generated"""
+        async for token in astream_completion(
+            self.llm, self._summary_template, ranked_diagnoses=ranked_diagnoses["ranked_diagnoses"]
+        ):
+            yield token
@@ -1,58 +1,103 @@
-from typing import List, Dict, Any
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+from typing import AsyncIterator, List, Dict, Any, Optional
+from langchain_core.language_models import BaseChatModel
+from src.core.llm_clients import acomplete, astream_completion, chat_prompt, complete, get_chat_llm
+
+EVALUATION_SYSTEM_PROMPT = """You are a senior physician acting as an impartial judge. Evaluate the medical assessment you are given.
+
+Provide a comprehensive evaluation with:
+1. Diagnosis Quality Assessment
+   - Completeness
+   - Evidence-based reasoning
+   - Clinical relevance
+2. Alternative Explanations Review
+   - Coverage of possibilities
+   - Differential diagnosis quality
+3. Overall Assessment
+   - Confidence in conclusions
+   - Areas of uncertainty
+   - Recommendations for improvement"""
+
+VALIDATION_SYSTEM_PROMPT = """You are a senior physician acting as an impartial judge. Validate the risk assessment you are given.
+
+Provide a validation with:
+1. Risk Level Appropriateness
+2. Action Recommendations Review
+3. Time Sensitivity Assessment
+4. Potential Oversights
+5. Additional Considerations"""
+
+RECOMMENDATION_SYSTEM_PROMPT = """You are a senior physician acting as an impartial judge. Based on the evaluations you are given, provide final recommendations.
+
+Provide a structured final recommendation with:
+1. Primary Action Items
+2. Follow-up Requirements
+3. Monitoring Recommendations
+4. Contingency Plans
+5. Patient Communication Points"""
+
+REVIEW_SYSTEM_PROMPT = """You are a senior physician acting as an impartial judge. Based on the diagnosis evaluation and the risk assessment you are given, validate the risk assessment and provide final recommendations in a single response.
+
+First check the risk assessment for:
+- Risk level appropriateness
+- Time sensitivity
+- Potential oversights
+
+Then provide a structured final recommendation that accounts for that check, with:
+1. Primary Action Items
+2. Follow-up Requirements
+3. Monitoring Recommendations
+4. Contingency Plans
+5. Patient Communication Points"""
 
 class LLMJudge:
-    def __init__(self, openai_api_key: str):
-        self.llm = ChatOpenAI(temperature=0, model="gpt-4", openai_api_key=openai_api_key)
-        
-    def evaluate_diagnosis(self, 
+    def __init__(self, openai_api_key: str, model: str = "gpt-4o-mini", llm: Optional[BaseChatModel] = None):
+        self.llm = llm or get_chat_llm(openai_api_key, model)
+
+        self._evaluation_template = chat_prompt(
+            EVALUATION_SYSTEM_PROMPT,
+            "Symptoms: {symptoms}\n\nMedical Context:\n{medical_context}\n\n"
+            "Primary Diagnosis:\n{diagnosis}\n\nAlternative Explanations:\n{alternatives}"
+        )
+        self._validation_template = chat_prompt(VALIDATION_SYSTEM_PROMPT, "{risk_assessment}")
+        self._recommendation_template = chat_prompt(
+            RECOMMENDATION_SYSTEM_PROMPT,
+            "Diagnosis Evaluation:\n{evaluation}\n\nRisk Assessment Validation:\n{risk_validation}"
+        )
+        self._review_template = chat_prompt(
+            REVIEW_SYSTEM_PROMPT,
+            "Diagnosis Evaluation:\n{evaluation}\n\nRisk Assessment:\n{risk_assessment}"
+        )
+
+    def evaluate_diagnosis(self,
                           symptoms: List[str],
                           medical_context: Dict[str, Any],
                           diagnosis: Dict[str, Any],
                           alternatives: Dict[str, Any]) -> Dict[str, Any]:
         """Evaluate the quality and validity of the diagnosis and alternatives"""
-        
-        prompt = PromptTemplate(
-            input_variables=["symptoms", "medical_context", "diagnosis", "alternatives"],
-            template="""
-            Evaluate the following medical assessment:
-            
-            Symptoms: {symptoms}
-            
-            Medical Context:
-            {medical_context}
-            
-            Primary Diagnosis:
-            {diagnosis}
-            
-            Alternative Explanations:
-            {alternatives}
-            
-            Provide a comprehensive evaluation with:
-            1. Diagnosis Quality Assessment
-               - Completeness
-               - Evidence-based reasoning
-               - Clinical relevance
-            2. Alternative Explanations Review
-               - Coverage of possibilities
-               - Differential diagnosis quality
-            3. Overall Assessment
-               - Confidence in conclusions
-               - Areas of uncertainty
-               - Recommendations for improvement
-            """
+        evaluation = complete(
+            self.llm, self._evaluation_template,
+            symptoms=symptoms, medical_context=medical_context, diagnosis=diagnosis, alternatives=alternatives
         )
-        
-        evaluation = self.llm.predict(
-            prompt.format(
-                symptoms=symptoms,
-                medical_context=medical_context,
-                diagnosis=diagnosis,
-                alternatives=alternatives
-            )
+
+        return {
+            "symptoms": symptoms,
+            "medical_context": medical_context,
+            "diagnosis": diagnosis,
+            "alternatives": alternatives,
+            "evaluation": evaluation
+        }
+
+    async def aevaluate_diagnosis(self,
+                                 symptoms: List[str],
+                                 medical_context: Dict[str, Any],
+                                 diagnosis: Dict[str, Any],
+                                 alternatives: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of evaluate_diagnosis"""
+        evaluation = await acomplete(
+            self.llm, self._evaluation_template,
+            symptoms=symptoms, medical_context=medical_context, diagnosis=diagnosis, alternatives=alternatives
         )
-        
+
         return {
             "symptoms": symptoms,
             "medical_context": medical_context,
@@ -60,63 +105,45 @@ class LLMJudge:
             "alternatives": alternatives,
             "evaluation": evaluation
         }
-    
+
     def validate_risk_assessment(self, risk_assessment: Dict[str, Any]) -> Dict[str, Any]:
         """Validate the risk assessment and its implications"""
-        prompt = PromptTemplate(
-            input_variables=["risk_assessment"],
-            template="""
-            Validate the following risk assessment:
-            
-            {risk_assessment}
-            
-            Provide a validation with:
-            1. Risk Level Appropriateness
-            2. Action Recommendations Review
-            3. Time Sensitivity Assessment
-            4. Potential Oversights
-            5. Additional Considerations
-            """
-        )
-        
-        validation = self.llm.predict(
-            prompt.format(
-                risk_assessment=risk_assessment
-            )
-        )
-        
+        validation = complete(self.llm, self._validation_template, risk_assessment=risk_assessment)
+
         return {
             "original_assessment": risk_assessment,
             "validation": validation
         }
-    
-    def get_final_recommendation(self, 
+
+    def get_final_recommendation(self,
                                evaluation: Dict[str, Any],
                                risk_validation: Dict[str, Any]) -> str:
         """Generate final recommendations based on all evaluations"""
-        prompt = PromptTemplate(
-            input_variables=["evaluation", "risk_validation"],
-            template="""
-            Based on the following evaluations, provide final recommendations:
-            
-            Diagnosis Evaluation:
-            {evaluation}
-            
-            Risk Assessment Validation:
-            {risk_validation}
-            
-            Provide a structured final recommendation with:
-            1. Primary Action Items
-            2. Follow-up Requirements
-            3. Monitoring Recommendations
-            4. Contingency Plans
-            5. Patient Communication Points
-            """
+        return complete(
+            self.llm, self._recommendation_template,
+            evaluation=evaluation["evaluation"], risk_validation=risk_validation["validation"]
+        )
+
+    def review_case(self, evaluation: Dict[str, Any], risk_assessment: Dict[str, Any]) -> str:
+        """Validate the risk assessment and give final recommendations in one call"""
+        return complete(
+            self.llm, self._review_template,
+            evaluation=evaluation["evaluation"], risk_assessment=risk_assessment
+        )
+
+    async def areview_case(self, evaluation: Dict[str, Any], risk_assessment: Dict[str, Any]) -> str:
+        """Async variant of review_case"""
+        return await acomplete(
+            self.llm, self._review_template,
+            evaluation=evaluation["evaluation"], risk_assessment=risk_assessment
         )
-        
-        return self.llm.predict(
-            prompt.format(
-                evaluation=evaluation["evaluation"],
-                risk_validation=risk_validation["validation"]
-            )
-        ) 
\ No newline at end of file
+
+    async def astream_review_case(self,
+                                  evaluation: Dict[str, Any],
+                                  risk_assessment: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream the combined review token by token as it is generated"""
+        async for token in astream_completion(
+            self.llm, self._review_template,
+            evaluation=evaluation["evaluation"], risk_assessment=risk_assessment
+        ):
+            yield token
@@ -1,73 +1,220 @@
-from typing import List, Dict, Any
-from langchain.agents import AgentExecutor
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
-from langchain.tools import Tool
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import FAISS
-import json
+from typing import FrozenSet, List, Dict, Any, Optional
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+import numpy as np
+import orjson
+from src.core.llm_clients import acomplete, chat_prompt, complete, get_chat_llm, get_embeddings
+from src.utils.semantic_cache import SemanticCache
+from src.utils.ttl_cache import TTLCache
+
+CONTEXT_SYSTEM_PROMPT = """You are a medical knowledge specialist. Based on the symptoms and medical knowledge you are given, provide a comprehensive medical context.
+
+Provide a structured response with:
+1. Relevant medical conditions
+2. Key diagnostic criteria
+3. Important medical considerations
+4. Potential risk factors"""
+
+# Exact symptom sets seen recently skip both the embedding call and the semantic lookup
+CONTEXT_EXACT_CACHE_SIZE = 4096
+CONTEXT_EXACT_CACHE_TTL_SECONDS = 3600
+
+# Knowledge bases at least this large use a compressed IVF-PQ index instead of a flat scan
+IVFPQ_MIN_ENTRIES = 10000
+IVFPQ_NPROBE = 16
 
 class MedicalKnowledgeRetriever:
-    def __init__(self, openai_api_key: str):
-        self.llm = ChatOpenAI(temperature=0, model="gpt-4", openai_api_key=openai_api_key)
-        self.embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
-        
+    def __init__(self,
+                 openai_api_key: str,
+                 model: str = "gpt-4o",
+                 llm: Optional[BaseChatModel] = None,
+                 embeddings: Optional[Embeddings] = None,
+                 context_cache: Optional[SemanticCache] = None):
+        self.llm = llm or get_chat_llm(openai_api_key, model)
+        self.embeddings = embeddings or get_embeddings(openai_api_key)
+
         # Initialize vector store with medical knowledge
         # This is a placeholder - you would need to load your medical knowledge base
         self.vector_store = None
-        
+
+        # Optional semantic cache of previous context analyses, keyed by query embedding
+        self.context_cache = context_cache
+        self.context_exact_cache = TTLCache(CONTEXT_EXACT_CACHE_SIZE, CONTEXT_EXACT_CACHE_TTL_SECONDS)
+
+        self._context_template = chat_prompt(
+            CONTEXT_SYSTEM_PROMPT, "Symptoms: {symptoms}\n\nMedical Knowledge:\n{knowledge}"
+        )
+
     def setup_vector_store(self, medical_knowledge: List[Dict[str, Any]]):
         """Setup the vector store with medical knowledge"""
-        texts = [json.dumps(knowledge) for knowledge in medical_knowledge]
-        self.vector_store = FAISS.from_texts(texts, self.embeddings)
-    
-    def retrieve_relevant_knowledge(self, symptoms: List[str]) -> List[Dict[str, Any]]:
+        # Search on the short descriptive text and keep the entries themselves as metadata
+        texts = [self._searchable_text(knowledge) for knowledge in medical_knowledge]
+        # Embed the whole knowledge base in batched requests, then build the index from the vectors
+        vectors = self.embeddings.embed_documents(texts)
+
+        if len(texts) < IVFPQ_MIN_ENTRIES:
+            self.vector_store = FAISS.from_embeddings(
+                list(zip(texts, vectors)), self.embeddings, metadatas=medical_knowledge
+            )
+        else:
+            self.vector_store = self._build_ivfpq_store(texts, vectors, medical_knowledge)
+
+    @staticmethod
+    def _searchable_text(knowledge: Dict[str, Any]) -> str:
+        """Pick the text a knowledge entry is embedded and searched by"""
+        return knowledge.get("summary") or knowledge.get("title") or orjson.dumps(knowledge, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def _build_ivfpq_store(self,
+                           texts: List[str],
+                           vectors: List[List[float]],
+                           metadatas: List[Dict[str, Any]]) -> FAISS:
+        """Build a partitioned, product-quantized index for large knowledge bases"""
+        # Only this path uses faiss directly, so smaller knowledge bases never import it here
+        import faiss
+
+        matrix = np.asarray(vectors, dtype="float32")
+        count, dimension = matrix.shape
+
+        # PQ needs the sub-quantizer count to divide the embedding dimension
+        subquantizers = next(m for m in (64, 32, 16, 8, 4, 2, 1) if dimension % m == 0)
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, min(4096, count // 40), subquantizers, 8)
+        index.train(matrix)
+        index.add(matrix)
+        index.nprobe = IVFPQ_NPROBE
+
+        docstore = InMemoryDocstore({
+            str(i): Document(page_content=text, metadata=metadata)
+            for i, (text, metadata) in enumerate(zip(texts, metadatas))
+        })
+        index_to_docstore_id = {i: str(i) for i in range(count)}
+
+        return FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+
+    def retrieve_relevant_knowledge(self,
+                                    symptoms: List[str],
+                                    embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         """Retrieve relevant medical knowledge based on symptoms"""
+        if embedding is None:
+            # Combine symptoms into a single query
+            embedding = self.embeddings.embed_query(" ".join(symptoms))
+
+        return self._knowledge_by_vector(embedding)
+
+    async def aretrieve_relevant_knowledge(self,
+                                           symptoms: List[str],
+                                           embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Async variant of retrieve_relevant_knowledge"""
+        if embedding is None:
+            embedding = await self.embeddings.aembed_query(" ".join(symptoms))
+
+        return await self._aknowledge_by_vector(embedding)
+
+    def _knowledge_by_vector(self, embedding: List[float]) -> List[Dict[str, Any]]:
+        """Retrieve relevant medical knowledge for an already embedded query"""
         if not self.vector_store:
             raise ValueError("Vector store not initialized. Call setup_vector_store first.")
-        
-        # Combine symptoms into a single query
-        query = " ".join(symptoms)
-        
+
         # Retrieve relevant documents
-        docs = self.vector_store.similarity_search(query, k=3)
-        
-        # Parse the documents back into dictionaries
-        knowledge = [json.loads(doc.page_content) for doc in docs]
-        
-        return knowledge
-    
-    def get_medical_context(self, symptoms: List[str]) -> Dict[str, Any]:
-        """Get comprehensive medical context for the given symptoms"""
-        knowledge = self.retrieve_relevant_knowledge(symptoms)
-        
-        prompt = PromptTemplate(
-            input_variables=["symptoms", "knowledge"],
-            template="""
-            Based on the following symptoms and medical knowledge, provide a comprehensive medical context:
-            
-            Symptoms: {symptoms}
-            
-            Medical Knowledge:
-            {knowledge}
-            
-            Provide a structured response with:
-            1. Relevant medical conditions
-            2. Key diagnostic criteria
-            3. Important medical considerations
-            4. Potential risk factors
-            """
+        docs = self.vector_store.similarity_search_by_vector(embedding, k=3)
+
+        return [doc.metadata for doc in docs]
+
+    async def _aknowledge_by_vector(self, embedding: List[float]) -> List[Dict[str, Any]]:
+        """Async variant of _knowledge_by_vector"""
+        if not self.vector_store:
+            raise ValueError("Vector store not initialized. Call setup_vector_store first.")
+
+        docs = await self.vector_store.asimilarity_search_by_vector(embedding, k=3)
+
+        return [doc.metadata for doc in docs]
+
+    def get_medical_context(self,
+                            symptoms: List[str],
+                            embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Get comprehensive medical context for the given symptoms, reusing their embedding if already computed"""
+        key = self._symptom_key(symptoms)
+        cached = self.context_exact_cache.get(key)
+        if cached is not None:
+            return {**cached, "symptoms": symptoms}
+
+        if embedding is None:
+            embedding = self.embeddings.embed_query(" ".join(symptoms))
+
+        # Paraphrased symptom sets reuse the earlier analysis
+        cached = self.context_cache.lookup_vector(embedding) if self.context_cache is not None else None
+        if cached is not None:
+            self.context_exact_cache.set(key, cached)
+            return {**cached, "symptoms": symptoms}
+
+        knowledge = self._knowledge_by_vector(embedding)
+
+        response = complete(
+            self.llm, self._context_template, symptoms=symptoms, knowledge=self._serialize_knowledge(knowledge)
         )
-        
-        response = self.llm.predict(
-            prompt.format(
-                symptoms=symptoms,
-                knowledge=json.dumps(knowledge, indent=2)
-            )
+
+        context = {
+            "symptoms": symptoms,
+            "medical_knowledge": knowledge,
+            "context_analysis": response
+        }
+        if self.context_cache is not None:
+            self.context_cache.update_vector(embedding, None, context)
+        self.context_exact_cache.set(key, context)
+
+        return context
+
+    async def aget_medical_context(self,
+                                   symptoms: List[str],
+                                   embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Async variant of get_medical_context"""
+        key = self._symptom_key(symptoms)
+        cached = self.context_exact_cache.get(key)
+        if cached is not None:
+            return {**cached, "symptoms": symptoms}
+
+        if embedding is None:
+            embedding = await self.embeddings.aembed_query(" ".join(symptoms))
+
+        cached = self.context_cache.lookup_vector(embedding) if self.context_cache is not None else None
+        if cached is not None:
+            self.context_exact_cache.set(key, cached)
+            return {**cached, "symptoms": symptoms}
+
+        knowledge = await self._aknowledge_by_vector(embedding)
+
+        response = await acomplete(
+            self.llm, self._context_template, symptoms=symptoms, knowledge=self._serialize_knowledge(knowledge)
         )
-        
-        return {
+
+        context = {
             "symptoms": symptoms,
             "medical_knowledge": knowledge,
             "context_analysis": response
-        } 
\ No newline at end of file
+        }
+        if self.context_cache is not None:
+            self.context_cache.update_vector(embedding, None, context)
+        self.context_exact_cache.set(key, context)
+
+        return context
+
+    @staticmethod
+    def _symptom_key(symptoms: List[str]) -> FrozenSet[str]:
+        """Key a symptom list by its normalized set, ignoring order, case and whitespace"""
+        if isinstance(symptoms, str):
+            symptoms = [symptoms]
+        return frozenset(str(symptom).strip().lower() for symptom in symptoms)
+
+    def clear_cache(self):
+        """Drop all cached context analyses"""
+        self.context_exact_cache.clear()
+        if self.context_cache is not None:
+            self.context_cache.clear()
+
+    @staticmethod
+    def _serialize_knowledge(knowledge: List[Dict[str, Any]]) -> str:
+        """Serialize retrieved knowledge entries for the context prompt"""
+        return orjson.dumps(knowledge, option=orjson.OPT_NON_STR_KEYS).decode()
@@ -1,74 +1,68 @@
-from typing import List, Dict, Any
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+import re
+from typing import AsyncIterator, List, Dict, Any, Optional
+from langchain_core.language_models import BaseChatModel
+from src.core.llm_clients import acomplete, astream_completion, chat_prompt, complete, get_chat_llm
+
+RISK_SYSTEM_PROMPT = """You are a clinical risk assessor. Based on the symptoms and medical context you are given, evaluate the potential risks.
+
+Provide a structured risk assessment with:
+1. Risk Level (Low/Medium/High)
+2. Immediate Concerns
+3. Potential Complications
+4. Recommended Actions
+5. Time Sensitivity"""
+
+SUMMARY_SYSTEM_PROMPT = """You are a clinical risk assessor. Provide a concise summary of the risk assessment you are given.
+
+Focus on the most critical points and recommended actions."""
 
 class RiskEvaluator:
-    def __init__(self, openai_api_key: str):
-        self.llm = ChatOpenAI(temperature=0, model="gpt-4", openai_api_key=openai_api_key)
-        
+    # One case-insensitive pass over the analysis instead of a substring scan per keyword
+    _IMMEDIATE_RE = re.compile(
+        r"high risk|emergency|immediate|urgent|severe|critical|life-threatening",
+        re.IGNORECASE
+    )
+
+    def __init__(self, openai_api_key: str, model: str = "gpt-4o", llm: Optional[BaseChatModel] = None):
+        self.llm = llm or get_chat_llm(openai_api_key, model)
+
+        self._risk_template = chat_prompt(RISK_SYSTEM_PROMPT, "Symptoms: {symptoms}\n\nMedical Context:\n{medical_context}")
+        self._summary_template = chat_prompt(SUMMARY_SYSTEM_PROMPT, "{risk_assessment}")
+
     def evaluate_risk(self, symptoms: List[str], medical_context: Dict[str, Any]) -> Dict[str, Any]:
         """Evaluate medical risks based on symptoms and medical context"""
-        
-        prompt = PromptTemplate(
-            input_variables=["symptoms", "medical_context"],
-            template="""
-            Based on the following symptoms and medical context, evaluate the potential risks:
-            
-            Symptoms: {symptoms}
-            
-            Medical Context:
-            {medical_context}
-            
-            Provide a structured risk assessment with:
-            1. Risk Level (Low/Medium/High)
-            2. Immediate Concerns
-            3. Potential Complications
-            4. Recommended Actions
-            5. Time Sensitivity
-            """
-        )
-        
-        response = self.llm.predict(
-            prompt.format(
-                symptoms=symptoms,
-                medical_context=medical_context
-            )
-        )
-        
-        # Parse the response into a structured format
-        risk_assessment = {
+        response = complete(self.llm, self._risk_template, symptoms=symptoms, medical_context=medical_context)
+
+        return self._build_assessment(symptoms, medical_context, response)
+
+    async def aevaluate_risk(self, symptoms: List[str], medical_context: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of evaluate_risk"""
+        response = await acomplete(self.llm, self._risk_template, symptoms=symptoms, medical_context=medical_context)
+
+        return self._build_assessment(symptoms, medical_context, response)
+
+    def _build_assessment(self, symptoms: List[str], medical_context: Dict[str, Any], response: str) -> Dict[str, Any]:
+        """Parse the response into a structured format"""
+        return {
             "symptoms": symptoms,
             "medical_context": medical_context,
             "risk_analysis": response,
             "requires_immediate_attention": self._check_immediate_attention(response)
         }
-        
-        return risk_assessment
-    
+
     def _check_immediate_attention(self, risk_analysis: str) -> bool:
         """Check if the risk analysis indicates need for immediate attention"""
-        immediate_keywords = [
-            "high risk", "emergency", "immediate", "urgent",
-            "severe", "critical", "life-threatening"
-        ]
-        
-        return any(keyword in risk_analysis.lower() for keyword in immediate_keywords)
-    
+        return bool(self._IMMEDIATE_RE.search(risk_analysis))
+
     def get_risk_summary(self, risk_assessment: Dict[str, Any]) -> str:
         """Generate a concise summary of the risk assessment"""
-        prompt = PromptTemplate(
-            input_variables=["risk_assessment"],
-            template="""
-            Provide a concise summary of the following risk assessment:
-            
-            {risk_assessment}
-            
-            Focus on the most critical points and recommended actions.
-            """
-        )
-        
-        return self.llm.predict(
-            prompt.format(
-                risk_assessment=risk_assessment
-            )
-        ) 
\ No newline at end of file
+        return complete(self.llm, self._summary_template, risk_assessment=risk_assessment)
+
+    async def aget_risk_summary(self, risk_assessment: Dict[str, Any]) -> str:
+        """Async variant of get_risk_summary"""
+        return await acomplete(self.llm, self._summary_template, risk_assessment=risk_assessment)
+
+    async def astream_risk_summary(self, risk_assessment: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream the risk summary token by token as it is generated"""
+        async for token in astream_completion(self.llm, self._summary_template, risk_assessment=risk_assessment):
+            yield token
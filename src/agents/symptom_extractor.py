@@ -1,26 +1,38 @@
-from typing import Dict, Any, List
-from langchain.agents import AgentExecutor
-from langchain.agents.format_scratchpad import format_to_openai_function_messages
-from langchain.agents.output_parsers import OpenAIFunctionsAgentOutputParser
+from functools import cached_property
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.tools.render import format_tool_to_openai_function
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
+from src.core.llm_clients import get_chat_llm
+
+if TYPE_CHECKING:
+    from langchain.agents import AgentExecutor
+
+EXTRACTION_SYSTEM_PROMPT = "You are a medical symptom extraction agent. Your task is to identify and extract relevant symptoms from patient input."
 
 class SymptomExtractor:
-    def __init__(self, model_name: str = "gpt-4"):
-        self.llm = ChatOpenAI(model_name=model_name, temperature=0)
+    def __init__(self, model_name: str = "gpt-4o", llm: Optional[BaseChatModel] = None):
+        self.llm = llm or get_chat_llm(model=model_name)
         self.tools = self._setup_tools()
-        self.agent = self._setup_agent()
 
     def _setup_tools(self) -> List[Any]:
         """Setup tools for symptom extraction."""
         # TODO: Implement specific tools for symptom extraction
         return []
 
-    def _setup_agent(self) -> AgentExecutor:
+    @cached_property
+    def agent(self) -> "AgentExecutor":
+        """Agent executor, built on first extraction."""
+        return self._setup_agent()
+
+    def _setup_agent(self) -> "AgentExecutor":
         """Setup the agent with tools and prompt."""
+        # langchain.agents pulls in a large import tree, so load it only when an agent is built
+        from langchain.agents import AgentExecutor
+        from langchain.agents.format_scratchpad import format_to_openai_function_messages
+        from langchain.agents.output_parsers import OpenAIFunctionsAgentOutputParser
+
         prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a medical symptom extraction agent. Your task is to identify and extract relevant symptoms from patient input."),
+            ("system", EXTRACTION_SYSTEM_PROMPT),
             ("user", "{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ])
@@ -64,10 +76,8 @@ class SymptomExtractor:
 
     def _combine_inputs(self, input_data: Dict[str, Any]) -> str:
         """Combine different input types into a single text."""
-        combined = []
-        
-        for result in input_data.get("results", []):
-            if result["status"] == "success":
-                combined.append(f"{result['type']}: {result['content']}")
-        
-        return "\n".join(combined) 
\ No newline at end of file
+        return "\n".join(
+            f"{result['type']}: {result['content']}"
+            for result in input_data.get("results", ())
+            if result.get("status") == "success"
+        ) 
\ No newline at end of file
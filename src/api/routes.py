@@ -69,7 +69,14 @@ async def analyze_symptoms(
             "message": str(e)
         }
 
+@app.get("/cache_info")
+async def cache_info():
+    """
+    Report hit rate and size of the similar-case cache.
+    """
+    return copilot.cache_info()
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup resources on shutdown."""
-    copilot.close() 
\ No newline at end of file
+    await copilot.close() 
\ No newline at end of file
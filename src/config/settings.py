@@ -17,6 +17,43 @@ class Settings(BaseSettings):
     
     # Neo4j Configuration
     NEO4J_DATABASE: str = "medical_copilot"
+    NEO4J_POOL_SIZE: int = 50
+    NEO4J_ACQ_TIMEOUT: float = 30.0  # Seconds to wait for a pooled connection before failing
+    NEO4J_MAX_CONNECTION_LIFETIME: int = 3600
+    NEO4J_WRITE_BUFFER_SIZE: int = 100  # Cases coalesced into one write transaction; 1 writes through
+    NEO4J_WRITE_FLUSH_INTERVAL: float = 0.5  # Seconds a queued case waits before a partial batch is written
+    NEO4J_WRITE_MAX_QUEUED: int = 10000  # Cases held while Neo4j is unreachable; beyond this new cases are refused
+    NEO4J_WRITE_MAX_RETRY_INTERVAL: float = 30.0  # Cap on the doubling delay between retries of a failed batch
+    
+    # Model Configuration
+    AGENT_MODEL: str = "gpt-4o"
+    LIGHT_AGENT_MODEL: str = "gpt-4o-mini"  # Symptom extraction and alternative explanations; diagnosis and risk stay on AGENT_MODEL
+    JUDGE_MODEL: str = "gpt-4o-mini"  # Critiquing generated text does not need the larger model
+    
+    # Generate diagnosis, alternatives and evaluation in one call instead of three.
+    # Off by default: the separate judge model gives a more independent evaluation.
+    BUNDLED_DIAGNOSIS: bool = False
+    
+    # LLM Response Cache Configuration
+    LLM_CACHE_ENABLED: bool = False  # Opt-in: installs a process-global cache shared by every LangChain model
+    LLM_CACHE_MAX_SIZE: int = 1024
+    LLM_CACHE_TTL_SECONDS: int = 3600  # Expire cached answers so stale knowledge is refreshed
+    
+    # Safety Check Cache Configuration
+    SAFETY_CACHE_MAX_SIZE: int = 1024
+    SAFETY_CACHE_TTL_SECONDS: int = 600  # Keep sanitized results short-lived for auditability
+    
+    # Semantic Workflow Cache Configuration
+    SEMANTIC_CACHE_ENABLED: bool = False  # Opt-in: near-identical inputs can still differ clinically (e.g. a negation)
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Minimum cosine similarity for reusing a previous result
+    SEMANTIC_CACHE_MAX_SIZE: int = 1024
+    SEMANTIC_CACHE_TTL_SECONDS: int = 600
+    
+    # Medical Context Cache Configuration
+    CONTEXT_SEMANTIC_CACHE_ENABLED: bool = False  # Opt-in: reuses the context analysis of paraphrased symptom sets
+    CONTEXT_SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Minimum cosine similarity between symptom embeddings
+    CONTEXT_SEMANTIC_CACHE_MAX_SIZE: int = 1024
+    CONTEXT_SEMANTIC_CACHE_TTL_SECONDS: int = 3600
     
     # Deepgram Configuration
     DEEPGRAM_API_KEY: Optional[str] = None  # Allow extra env var
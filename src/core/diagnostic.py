@@ -1,12 +1,12 @@
 import os
+import sys
 
 def check_env_vars(required_vars):
-    print("🔍 Checking Environment Variables...")
+    # Look each variable up once and emit the whole report in a single write
+    lines = ["🔍 Checking Environment Variables..."]
     for var in required_vars:
-        if not os.getenv(var):
-            print(f"❌ Missing: {var}")
-        else:
-            print(f"✅ Found: {var}")
+        lines.append(f"{'✅ Found' if os.environ.get(var) else '❌ Missing'}: {var}")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 def main():
     required_vars = [
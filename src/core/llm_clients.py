@@ -0,0 +1,150 @@
+import asyncio
+import importlib.util
+import os
+import threading
+import weakref
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, AsyncGenerator, AsyncIterator, Dict, Optional, Tuple
+import httpx
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+# Upper bound on in-flight OpenAI requests, so parallel agents don't thrash on 429s
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+
+# asyncio primitives are bound to one event loop, so keep one semaphore per loop
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+# Connection pool shared by every OpenAI client so agents reuse warm TCP+TLS sessions
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=50, max_connections=100)
+
+# With the optional h2 package installed, parallel workflow branches multiplex over one connection per host
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+@lru_cache(maxsize=None)
+def get_http_client() -> httpx.Client:
+    """Return the process-wide synchronous HTTP client"""
+    return httpx.Client(limits=_HTTP_LIMITS, http2=_HTTP2)
+
+async def _close_with_loop(pool: httpx.AsyncHTTPTransport) -> AsyncIterator[None]:
+    """Stay suspended for the life of the running loop, then close the pool"""
+    # asyncio.run finalizes pending async generators before it closes the loop, the last
+    # point at which the pool's sockets can still be closed cleanly
+    try:
+        yield
+    finally:
+        await pool.aclose()
+
+class _LoopLocalTransport(httpx.AsyncBaseTransport):
+    """Async transport that gives each event loop its own connection pool"""
+
+    def __init__(self):
+        self._pools: Dict[asyncio.AbstractEventLoop, Tuple[httpx.AsyncHTTPTransport, AsyncGenerator]] = {}
+        self._lock = threading.Lock()
+
+    async def _pool(self) -> httpx.AsyncHTTPTransport:
+        """Return the connection pool for the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._pools.get(loop)
+            if entry is not None:
+                return entry[0]
+            # Every workflow run gets a fresh loop from asyncio.run; pools of finished loops are already closed
+            for dead in [other for other in self._pools if other.is_closed()]:
+                del self._pools[dead]
+            pool = httpx.AsyncHTTPTransport(limits=_HTTP_LIMITS, http2=_HTTP2)
+            closer = _close_with_loop(pool)
+            self._pools[loop] = (pool, closer)
+        # Runs to the yield without suspending, registering the closer with the loop
+        await closer.asend(None)
+        return pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await (await self._pool()).handle_async_request(request)
+
+    async def aclose(self):
+        """Close the running loop's connection pool; pools of other loops are left alone"""
+        with self._lock:
+            entry = self._pools.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[1].aclose()
+
+@lru_cache(maxsize=None)
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the process-wide asynchronous HTTP client, safe to use from any event loop"""
+    return httpx.AsyncClient(transport=_LoopLocalTransport())
+
+def _warm_tokenizer(model: str):
+    """Load and cache the tiktoken encoding for a model, ignoring failures"""
+    import tiktoken
+
+    try:
+        tiktoken.encoding_for_model(model)
+    except Exception:
+        # Unknown models and offline hosts fall back to LangChain's lazy loading
+        pass
+
+@lru_cache(maxsize=None)
+def get_chat_llm(openai_api_key: Optional[str] = None, model: str = "gpt-4o") -> "ChatOpenAI":
+    """Return the shared chat model for the given API key and model"""
+    # Imported on first use to keep module import cheap
+    from langchain_openai import ChatOpenAI
+
+    # Load the tokenizer in the background so the first token count doesn't pay for it
+    threading.Thread(target=_warm_tokenizer, args=(model,), daemon=True).start()
+
+    return ChatOpenAI(
+        temperature=0,
+        model=model,
+        openai_api_key=openai_api_key,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client()
+    )
+
+@lru_cache(maxsize=None)
+def get_embeddings(openai_api_key: Optional[str] = None) -> "OpenAIEmbeddings":
+    """Return the shared embeddings client for the given API key"""
+    from langchain_openai import OpenAIEmbeddings
+
+    # Send up to 2048 texts per embeddings request instead of many small ones
+    return OpenAIEmbeddings(
+        openai_api_key=openai_api_key,
+        chunk_size=2048,
+        max_retries=6,
+        request_timeout=60,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client()
+    )
+
+def llm_semaphore() -> asyncio.Semaphore:
+    """Return the OpenAI concurrency limiter for the running event loop"""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+    return semaphore
+
+def chat_prompt(system_prompt: str, user_template: str) -> ChatPromptTemplate:
+    """Build an agent prompt from static instructions and a per-call user message"""
+    # Static instructions go in the system message so the prompt prefix is byte-identical
+    # across calls and eligible for provider-side prompt caching. Agents build their
+    # templates once, in __init__, and fill them per call.
+    return ChatPromptTemplate.from_messages([("system", system_prompt), ("user", user_template)])
+
+def complete(llm: Runnable, prompt: ChatPromptTemplate, **inputs: Any) -> str:
+    """Run a chat completion on a prompt template filled with the given inputs"""
+    return llm.invoke(prompt.format_messages(**inputs)).content
+
+async def acomplete(llm: Runnable, prompt: ChatPromptTemplate, **inputs: Any) -> str:
+    """Async variant of complete, run under the shared concurrency limit"""
+    async with llm_semaphore():
+        return (await llm.ainvoke(prompt.format_messages(**inputs))).content
+
+async def astream_completion(llm: Runnable, prompt: ChatPromptTemplate, **inputs: Any) -> AsyncIterator[str]:
+    """Stream a chat completion's tokens under the shared concurrency limit"""
+    async with llm_semaphore():
+        async for chunk in llm.astream(prompt.format_messages(**inputs)):
+            yield chunk.content
@@ -1,20 +1,49 @@
 import os
+import asyncio
 from typing import Optional, Union, Dict, Any
 from pathlib import Path
 import base64
-from PIL import Image
+from functools import cached_property, lru_cache
 import io
 
-import openai
-from openai import OpenAI
-import whisper
-from deepgram import Deepgram
+# The Vision API does not need full resolution; larger images are downscaled before upload
+MAX_IMAGE_DIMENSION = 1024
+IMAGE_JPEG_QUALITY = 85
+
+@lru_cache(maxsize=64)
+def _encode_image_file(image_path: str, mtime_ns: int, size: int) -> str:
+    """Downscale and JPEG-encode an image file, returning it base64-encoded."""
+    # mtime and size are part of the cache key so a modified file is re-encoded
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        image.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION))
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=IMAGE_JPEG_QUALITY)
+    return base64.b64encode(buffer.getbuffer()).decode('utf-8')
 
 class SymptomIntake:
-    def __init__(self):
-        self.openai_client = OpenAI()
-        self.whisper_model = whisper.load_model("base")
-        self.deepgram = Deepgram(os.getenv("DEEPGRAM_API_KEY"))
+    # Clients and models are created on first use so that importing and constructing
+    # SymptomIntake does not pull in the OpenAI SDK, CTranslate2 or Deepgram up front
+
+    @cached_property
+    def openai_client(self):
+        from openai import OpenAI
+
+        return OpenAI()
+
+    @cached_property
+    def whisper_model(self):
+        from faster_whisper import WhisperModel
+
+        # CTranslate2 int8 weights: far less memory bandwidth and faster CPU decoding than FP32
+        return WhisperModel("base", device="cpu", compute_type="int8", num_workers=2)
+
+    @cached_property
+    def deepgram(self):
+        from deepgram import Deepgram
+
+        return Deepgram(os.getenv("DEEPGRAM_API_KEY"))
 
     async def process_text_input(self, text: str) -> Dict[str, Any]:
         """Process text input for symptoms."""
@@ -39,9 +68,8 @@ class SymptomIntake:
         """Process voice input using either Whisper or Deepgram."""
         try:
             if use_whisper:
-                # Use OpenAI Whisper
-                result = self.whisper_model.transcribe(str(audio_file_path))
-                text = result["text"]
+                # Use OpenAI Whisper; transcription is CPU-bound, so keep it off the event loop
+                text = await asyncio.to_thread(self._transcribe, audio_file_path)
             else:
                 # Use Deepgram
                 with open(audio_file_path, "rb") as audio:
@@ -67,12 +95,12 @@ class SymptomIntake:
     async def process_image_input(self, image_path: Union[str, Path]) -> Dict[str, Any]:
         """Process image input using OpenAI Vision API."""
         try:
-            # Read and encode image
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+            # Read and encode image in a worker thread so large files don't stall the event loop
+            base64_image = await asyncio.to_thread(self._encode_image, image_path)
 
-            # Use OpenAI Vision API
-            response = self.openai_client.chat.completions.create(
+            # Use OpenAI Vision API; the client is synchronous, so keep the request off the event loop
+            response = await asyncio.to_thread(
+                self.openai_client.chat.completions.create,
                 model="gpt-4-vision-preview",
                 messages=[
                     {
@@ -103,6 +131,18 @@ class SymptomIntake:
                 "status": "error"
             }
 
+    def _transcribe(self, audio_file_path: Union[str, Path]) -> str:
+        """Transcribe an audio file with the local Whisper model."""
+        # Segments are decoded lazily, so consume them here inside the worker thread
+        segments, _ = self.whisper_model.transcribe(str(audio_file_path), beam_size=1)
+        return "".join(segment.text for segment in segments).strip()
+
+    @staticmethod
+    def _encode_image(image_path: Union[str, Path]) -> str:
+        """Read an image file and return it base64-encoded."""
+        stat = os.stat(image_path)
+        return _encode_image_file(str(image_path), stat.st_mtime_ns, stat.st_size)
+
     async def process_multi_modal_input(
         self,
         text: Optional[str] = None,
@@ -110,19 +150,24 @@ class SymptomIntake:
         image_file: Optional[Union[str, Path]] = None
     ) -> Dict[str, Any]:
         """Process multiple input types and combine their results."""
-        results = []
+        tasks = []
         
         if text:
-            text_result = await self.process_text_input(text)
-            results.append(text_result)
+            tasks.append(("text", self.process_text_input(text)))
             
         if audio_file:
-            voice_result = await self.process_voice_input(audio_file)
-            results.append(voice_result)
+            tasks.append(("voice", self.process_voice_input(audio_file)))
             
         if image_file:
-            image_result = await self.process_image_input(image_file)
-            results.append(image_result)
+            tasks.append(("image", self.process_image_input(image_file)))
+        
+        # The modalities are independent, so process them concurrently
+        outcomes = await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+        results = [
+            {"type": input_type, "error": str(outcome), "status": "error"}
+            if isinstance(outcome, Exception) else outcome
+            for (input_type, _), outcome in zip(tasks, outcomes)
+        ]
             
         return {
             "results": results,
@@ -3,19 +3,21 @@ import asyncio
 from typing import Dict, Any
 from dotenv import load_dotenv
 
-from core.symptom_intake import SymptomIntake
-from agents.symptom_extractor import SymptomExtractor
-from utils.neo4j_client import Neo4jClient
+from src.core.symptom_intake import SymptomIntake
+from src.agents.symptom_extractor import SymptomExtractor
+from src.utils.neo4j_client import AsyncNeo4jClient, candidate_symptoms, close_drivers, normalize_symptoms
+
+# Read .env once per process instead of on every MedicalCopilot()
+if not os.getenv("APP_ENV_LOADED"):
+    load_dotenv()
+    os.environ["APP_ENV_LOADED"] = "1"
 
 class MedicalCopilot:
     def __init__(self):
-        # Load environment variables
-        load_dotenv()
-        
         # Initialize components
         self.symptom_intake = SymptomIntake()
         self.symptom_extractor = SymptomExtractor()
-        self.neo4j_client = Neo4jClient()
+        self.neo4j_client = AsyncNeo4jClient()
         
         # Connect to Neo4j
         if not self.neo4j_client.connect():
@@ -43,29 +45,44 @@ class MedicalCopilot:
                     "details": input_results
                 }
             
-            # 2. Extract symptoms
-            symptom_results = await self.symptom_extractor.extract_symptoms(input_results)
+            # Look up which phrases of the raw input are stored symptoms while the LLM extracts them,
+            # warming the similar-cases cache for those symptoms
+            candidates = candidate_symptoms(" ".join(
+                result["content"] for result in input_results.get("results", ())
+                if result.get("status") == "success"
+            ))
+            prefetch = asyncio.create_task(self.neo4j_client.prefetch_similar_cases(candidates, limit=3))
             
-            if symptom_results["status"] == "error":
-                return {
-                    "status": "error",
-                    "message": "Failed to extract symptoms",
-                    "details": symptom_results
-                }
-            
-            # --- FIX: Ensure symptoms is always a list ---
-            symptoms = symptom_results["symptoms"]
-            if isinstance(symptoms, str):
-                symptoms = [symptoms]
-            elif not isinstance(symptoms, list):
-                symptoms = list(symptoms)
-            # -------------------------------------------
-
-            # 3. Find similar cases in Neo4j
-            similar_cases = self.neo4j_client.find_similar_cases(
-                symptoms=symptoms,
-                limit=3
-            )
+            try:
+                # 2. Extract symptoms
+                symptom_results = await self.symptom_extractor.extract_symptoms(input_results)
+                
+                if symptom_results["status"] == "error":
+                    return {
+                        "status": "error",
+                        "message": "Failed to extract symptoms",
+                        "details": symptom_results
+                    }
+                
+                # Always a sorted, deduped list of lowercase names, matching how symptoms are stored
+                symptoms = normalize_symptoms(symptom_results["symptoms"])
+                
+                # Names that are not stored symptoms never match, so when every extracted symptom
+                # is a raw-text phrase the lookup can be narrowed to the stored ones; if those are
+                # the ones the prefetch looked up, the result comes from the cache
+                if set(symptoms) <= set(candidates):
+                    known = await prefetch
+                    if known is not None:
+                        symptoms = [symptom for symptom in symptoms if symptom in known]
+                
+                # 3. Find similar cases in Neo4j
+                similar_cases = await self.neo4j_client.find_similar_cases(
+                    symptoms=symptoms,
+                    limit=3
+                )
+            finally:
+                # No-op once awaited; otherwise drop the speculative lookup
+                prefetch.cancel()
             
             # 4. Prepare final response
             return {
@@ -81,9 +98,15 @@ class MedicalCopilot:
                 "message": str(e)
             }
         
-    def close(self):
+    def cache_info(self) -> Dict[str, Any]:
+        """Report similar-case cache statistics."""
+        return self.neo4j_client.cache_info()
+
+    async def close(self):
         """Cleanup resources."""
-        self.neo4j_client.close()
+        await self.neo4j_client.close()
+        # The driver is shared by every copilot in the process, so only close it on shutdown
+        await close_drivers()
 
 async def main():
     # Example usage
@@ -97,7 +120,7 @@ async def main():
         print("Result:", result)
         
     finally:
-        copilot.close()
+        await copilot.close()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
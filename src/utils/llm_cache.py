@@ -0,0 +1,45 @@
+from typing import Any, Optional
+from langchain.globals import set_llm_cache
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from src.config.settings import Settings
+from src.utils.ttl_cache import TTLCache
+
+class TTLLLMCache(BaseCache):
+    """In-memory LLM response cache with LRU eviction and a time-to-live.
+
+    Keyed by LangChain on (prompt, llm_string), so a hit requires the same
+    formatted prompt and the same model configuration. Entries expire after
+    `ttl_seconds` so that stale medical knowledge is not served forever.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 3600):
+        self._cache = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Return the cached generations for this prompt, if still fresh"""
+        return self._cache.get((prompt, llm_string))
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Store generations for this prompt, evicting the least recently used entry"""
+        self._cache.set((prompt, llm_string), return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        """Drop all cached responses"""
+        self._cache.clear()
+
+def configure_llm_cache(settings: Settings) -> Optional[TTLLLMCache]:
+    """Install the process-wide LLM response cache.
+
+    All agents run with temperature=0, so identical prompts produce
+    equivalent answers and can safely be served from the cache.
+    """
+    if not settings.LLM_CACHE_ENABLED:
+        # Leave whatever cache the host application installed in place
+        return None
+
+    cache = TTLLLMCache(
+        maxsize=settings.LLM_CACHE_MAX_SIZE,
+        ttl_seconds=settings.LLM_CACHE_TTL_SECONDS
+    )
+    set_llm_cache(cache)
+    return cache
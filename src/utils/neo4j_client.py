@@ -1,51 +1,186 @@
-from typing import Dict, Any, List
-from neo4j import GraphDatabase
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
+from neo4j import AsyncDriver, AsyncGraphDatabase, Driver
+import logging
 import os
+import re
+from src.utils.ttl_cache import TTLCache
+
+# Indexes the symptom/diagnosis lookups and MERGEs rely on; idempotent, so safe to rerun
+SCHEMA_QUERIES = (
+    "CREATE CONSTRAINT symptom_name IF NOT EXISTS FOR (s:Symptom) REQUIRE s.name IS UNIQUE",
+    "CREATE CONSTRAINT case_id IF NOT EXISTS FOR (c:Case) REQUIRE c.id IS UNIQUE",
+    "CREATE INDEX diagnosis_name IF NOT EXISTS FOR (d:Diagnosis) ON (d.name)",
+)
+
+logger = logging.getLogger(__name__)
+
+def ensure_schema(driver: Driver, **query_options: Any) -> bool:
+    """Run SCHEMA_QUERIES on a sync driver; returns False, after logging, if any statement failed."""
+    try:
+        for statement in SCHEMA_QUERIES:
+            driver.execute_query(statement, **query_options)
+        return True
+    except Exception as e:
+        logger.error("Error creating Neo4j schema: %s", e)
+        return False
+
+async def aensure_schema(driver: AsyncDriver, **query_options: Any) -> bool:
+    """Async counterpart of ensure_schema."""
+    try:
+        for statement in SCHEMA_QUERIES:
+            await driver.execute_query(statement, **query_options)
+        return True
+    except Exception as e:
+        logger.error("Error creating Neo4j schema: %s", e)
+        return False
+
+def normalize_symptoms(symptoms: Union[str, Iterable[str]]) -> List[str]:
+    """Trim, lowercase and dedupe symptom names so they match the stored Symptom nodes."""
+    if isinstance(symptoms, str):
+        symptoms = [symptoms]
+    return sorted({str(symptom).strip().lower() for symptom in symptoms if symptom} - {""})
+
+# Raw-text phrases of up to this many words are tried as symptom names
+CANDIDATE_PHRASE_MAX_WORDS = 4
+
+def candidate_symptoms(text: str) -> List[str]:
+    """Every phrase of the text up to CANDIDATE_PHRASE_MAX_WORDS words long, normalized like symptom names."""
+    words = re.findall(r"[\w'-]+", text.lower())
+    return normalize_symptoms(
+        " ".join(words[start:start + size])
+        for size in range(1, CANDIDATE_PHRASE_MAX_WORDS + 1)
+        for start in range(len(words) - size + 1)
+    )
+
+# One driver (and connection pool) per set of credentials, shared by every client in the process
+_drivers: Dict[Tuple[str, str, str], AsyncDriver] = {}
+
+def get_driver(uri: str, user: str, password: str) -> AsyncDriver:
+    """Return the shared async driver for these credentials, creating it on first use."""
+    key = (uri, user, password)
+    if key not in _drivers:
+        # Size the pool explicitly and bound acquisition so bursts queue instead of stalling
+        _drivers[key] = AsyncGraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=int(os.getenv("NEO4J_POOL_SIZE", "50")),
+            connection_acquisition_timeout=float(os.getenv("NEO4J_ACQ_TIMEOUT", "30")),
+            max_connection_lifetime=3600,
+            keep_alive=True
+        )
+    return _drivers[key]
+
+async def close_drivers():
+    """Close every shared driver; call once on application shutdown."""
+    while _drivers:
+        _, driver = _drivers.popitem()
+        await driver.close()
+
+class AsyncNeo4jClient:
+    # Schema setup runs once per process, not once per client
+    _schema_ready = False
 
-class Neo4jClient:
     def __init__(self):
         self.uri = os.getenv("NEO4J_URI")
         self.user = os.getenv("NEO4J_USER")
         self.password = os.getenv("NEO4J_PASSWORD")
         self.driver = None
+        
+        # Repeated symptom sets within the TTL are answered without a round-trip
+        self._similar_cases_cache = TTLCache(
+            maxsize=int(os.getenv("NEO4J_SIMILAR_CASES_CACHE_SIZE", "4096")),
+            ttl_seconds=float(os.getenv("NEO4J_SIMILAR_CASES_CACHE_TTL", "300"))
+        )
 
     def connect(self):
         """Connect to Neo4j database."""
         try:
-            self.driver = GraphDatabase.driver(
-                self.uri,
-                auth=(self.user, self.password)
-            )
+            self.driver = get_driver(self.uri, self.user, self.password)
             return True
         except Exception as e:
             print(f"Failed to connect to Neo4j: {str(e)}")
             return False
 
-    def close(self):
-        """Close the Neo4j connection."""
-        if self.driver:
-            self.driver.close()
+    async def _ensure_schema(self):
+        """Create the schema indexes and constraints on first use."""
+        # Only a complete setup counts; after a failure the next call tries again
+        if not AsyncNeo4jClient._schema_ready:
+            AsyncNeo4jClient._schema_ready = await aensure_schema(self.driver)
+
+    async def close(self):
+        """Release this client; the shared driver stays open until close_drivers()."""
+        self.driver = None
 
-    def find_similar_cases(self, symptoms: List[str], limit: int = 3) -> List[Dict[str, Any]]:
+    async def prefetch_similar_cases(self, candidates: List[str], limit: int = 3) -> Optional[List[str]]:
+        """Warm the similar-cases cache from raw-text candidates; returns the candidates stored as Symptom names."""
+        query = """
+        UNWIND $names AS name
+        MATCH (s:Symptom {name: name})
+        RETURN s.name as name
+        """
+        
+        try:
+            await self._ensure_schema()
+            async with self.driver.session() as session:
+                result = await session.run(query, names=candidates)
+                known = [record["name"] async for record in result]
+        except Exception as e:
+            print(f"Error prefetching similar cases: {str(e)}")
+            return None
+        
+        # Extraction names the most specific phrase, e.g. "severe headache" rather than also "headache"
+        specific = [
+            name for name in known
+            if not any(other != name and f" {name} " in f" {other} " for other in known)
+        ]
+        await self.find_similar_cases(specific, limit)
+        return known
+
+    async def find_similar_cases(self, symptoms: List[str], limit: int = 3) -> List[Dict[str, Any]]:
         """Find similar cases based on symptoms."""
+        # Seek each symptom through the Symptom.name index instead of filtering every Symptom node
         query = """
-        MATCH (s:Symptom)-[:PART_OF]->(d:Diagnosis)
-        WHERE s.name IN $symptoms
-        WITH d, count(s) as symptom_count
+        UNWIND $symptoms AS name
+        MATCH (s:Symptom {name: name})-[:PART_OF]->(d:Diagnosis)
+        WITH d, count(DISTINCT s) as symptom_count
         ORDER BY symptom_count DESC
         LIMIT $limit
         RETURN d.name as diagnosis, d.confidence as confidence, symptom_count
         """
         
+        symptoms = normalize_symptoms(symptoms)
+        if not symptoms:
+            return []
+        key = (frozenset(symptoms), limit)
+        cached = self._similar_cases_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        
         try:
-            with self.driver.session() as session:
-                result = session.run(query, symptoms=symptoms, limit=limit)
-                return [dict(record) for record in result]
+            await self._ensure_schema()
+            async with self.driver.session() as session:
+                result = await session.run(query, symptoms=symptoms, limit=limit)
+                # Pick the known fields off the stream instead of converting whole records
+                cases = [
+                    {
+                        "diagnosis": record["diagnosis"],
+                        "confidence": record["confidence"],
+                        "symptom_count": record["symptom_count"]
+                    }
+                    async for record in result
+                ]
         except Exception as e:
             print(f"Error finding similar cases: {str(e)}")
             return []
+        
+        self._similar_cases_cache.set(key, cases)
+        return list(cases)
+
+    def cache_info(self) -> Dict[str, Any]:
+        """Report hit/miss statistics for the similar-cases cache."""
+        return self._similar_cases_cache.info()
 
-    def store_case(self, symptoms: List[str], diagnosis: str, confidence: float):
+    async def store_case(self, symptoms: List[str], diagnosis: str, confidence: float):
         """Store a new case in the graph."""
         query = """
         MERGE (d:Diagnosis {name: $diagnosis, confidence: $confidence})
@@ -56,14 +191,20 @@ class Neo4jClient:
         """
         
         try:
-            with self.driver.session() as session:
-                session.run(query, symptoms=symptoms, diagnosis=diagnosis, confidence=confidence)
-                return True
+            await self._ensure_schema()
+            async with self.driver.session() as session:
+                result = await session.run(
+                    query, symptoms=normalize_symptoms(symptoms), diagnosis=diagnosis, confidence=confidence
+                )
+                await result.consume()
+            # New cases change the rankings, so drop any cached lookups
+            self._similar_cases_cache.clear()
+            return True
         except Exception as e:
             print(f"Error storing case: {str(e)}")
             return False
 
-    def get_symptom_relationships(self, symptom: str) -> List[Dict[str, Any]]:
+    async def get_symptom_relationships(self, symptom: str) -> List[Dict[str, Any]]:
         """Get relationships between a symptom and other symptoms/diagnoses."""
         query = """
         MATCH (s:Symptom {name: $symptom})-[r]-(related)
@@ -73,9 +214,10 @@ class Neo4jClient:
         """
         
         try:
-            with self.driver.session() as session:
-                result = session.run(query, symptom=symptom)
-                return [dict(record) for record in result]
+            await self._ensure_schema()
+            async with self.driver.session() as session:
+                result = await session.run(query, symptom=symptom.strip().lower())
+                return [record.data() async for record in result]
         except Exception as e:
             print(f"Error getting symptom relationships: {str(e)}")
             return [] 
\ No newline at end of file
@@ -1,132 +1,254 @@
-from typing import Dict, Any, List, Optional
-from neo4j import GraphDatabase
+import atexit
+import logging
+import threading
+import uuid
+import weakref
+from typing import Dict, Any, List, Optional, Final
+from neo4j import GraphDatabase, Result, RoutingControl
 from src.config.settings import Settings
+from src.utils.neo4j_client import ensure_schema, normalize_symptoms
+
+logger = logging.getLogger(__name__)
+
+# Cypher is kept constant and fully parameterized so the server reuses cached query plans
+
+# One round-trip and one transaction per batch of cases
+STORE_CASES_QUERY: Final[str] = """
+UNWIND $cases AS case
+CREATE (c:Case {
+    id: case.id,
+    timestamp: datetime(),
+    symptoms: case.symptoms,
+    diagnosis: case.diagnosis,
+    confidence: case.confidence,
+    risk_level: case.risk_level
+})
+WITH c, case
+UNWIND case.symptoms as symptom
+MERGE (s:Symptom {name: symptom})
+CREATE (c)-[:HAS_SYMPTOM]->(s)
+WITH DISTINCT c, case
+UNWIND case.diagnosis as diag
+MERGE (d:Diagnosis {name: diag.name})
+CREATE (c)-[:HAS_DIAGNOSIS {confidence: diag.confidence}]->(d)
+"""
+
+# Cases written per transaction, keeping each transaction's memory bounded
+STORE_CASES_BATCH_SIZE = 5000
+
+# Symptoms are index seeks, and diagnoses are only expanded for the top-ranked cases
+FIND_SIMILAR_CASES_QUERY: Final[str] = """
+UNWIND $symptoms AS name
+MATCH (s:Symptom {name: name})<-[:HAS_SYMPTOM]-(c:Case)
+WITH c, count(DISTINCT s) as matching_symptoms
+WHERE EXISTS { (c)-[:HAS_DIAGNOSIS]->(:Diagnosis) }
+ORDER BY matching_symptoms DESC
+LIMIT $limit
+MATCH (c)-[:HAS_DIAGNOSIS]->(d:Diagnosis)
+RETURN c, collect(d) as diagnoses, matching_symptoms
+ORDER BY matching_symptoms DESC
+"""
+
+# Anchored on the Diagnosis.name index; each case is counted once and only the top rows are returned
+FIND_COMORBIDITIES_QUERY: Final[str] = """
+MATCH (d1:Diagnosis {name: $diagnosis})<-[:HAS_DIAGNOSIS]-(c:Case)-[:HAS_DIAGNOSIS]->(d2:Diagnosis)
+WHERE d1 <> d2
+WITH d2.name as diagnosis, count(DISTINCT c) as co_occurrence
+ORDER BY co_occurrence DESC
+LIMIT $limit
+RETURN diagnosis, co_occurrence
+"""
+
+# Independent subqueries so the label counts come from the count store without a cross product
+CASE_STATISTICS_QUERY: Final[str] = """
+CALL { MATCH (c:Case) RETURN count(c) as total_cases }
+CALL { MATCH (s:Symptom) RETURN count(s) as total_symptoms }
+CALL { MATCH (d:Diagnosis) RETURN count(d) as total_diagnoses }
+CALL { MATCH (c:Case)-[:HAS_DIAGNOSIS]->() RETURN count(DISTINCT c) as cases_with_diagnosis }
+RETURN {
+    total_cases: total_cases,
+    total_symptoms: total_symptoms,
+    total_diagnoses: total_diagnoses,
+    cases_with_diagnosis: cases_with_diagnosis
+} as stats
+"""
+
+# Managers that may still hold queued cases; the flush timer is a daemon thread, so they are flushed at exit
+_open_managers: "weakref.WeakSet[Neo4jManager]" = weakref.WeakSet()
+
+@atexit.register
+def _flush_open_managers():
+    """Write the cases still queued by managers that were never closed"""
+    for manager in list(_open_managers):
+        manager.flush()
+
+def _similar_cases(result: Result) -> List[Dict[str, Any]]:
+    """Build the similar cases from the record stream, picking only the returned fields"""
+    return [
+        {
+            "c": record["c"],
+            "diagnoses": record["diagnoses"],
+            "matching_symptoms": record["matching_symptoms"]
+        }
+        for record in result
+    ]
 
 class Neo4jManager:
+    # Schema setup runs once per process, not once per manager
+    _schema_ready = False
+
     def __init__(self, settings: Settings):
         self.settings = settings
         self.driver = GraphDatabase.driver(
             settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
+            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD),
+            max_connection_pool_size=settings.NEO4J_POOL_SIZE,
+            connection_acquisition_timeout=settings.NEO4J_ACQ_TIMEOUT,
+            max_connection_lifetime=settings.NEO4J_MAX_CONNECTION_LIFETIME,
+            keep_alive=True
         )
         
+        # Cases queued by store_case, written together by flush()
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffer_lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        # Doubles while writes keep failing so an outage is not retried every flush interval
+        self._flush_delay = settings.NEO4J_WRITE_FLUSH_INTERVAL
+        self._closed = False
+        _open_managers.add(self)
+    
+    def _ensure_schema(self):
+        """Create the schema indexes and constraints on first use"""
+        # Only a complete setup counts; after a failure the next call tries again
+        if not Neo4jManager._schema_ready:
+            Neo4jManager._schema_ready = ensure_schema(self.driver, database_=self.settings.NEO4J_DATABASE)
+        
     def store_case(self, case_data: Dict[str, Any]) -> bool:
-        """Store a medical case in Neo4j"""
-        with self.driver.session(database=self.settings.NEO4J_DATABASE) as session:
-            try:
-                # Create case node
-                result = session.write_transaction(
-                    self._create_case,
-                    case_data
-                )
-                return True
-            except Exception as e:
-                print(f"Error storing case: {str(e)}")
+        """Queue a medical case to be written with the next batch.
+
+        Returns True once the case is queued; it is written when the buffer fills, on the
+        flush timer or on close. Returns False if writing a full batch failed, in which case
+        the batch stays queued and is retried, or if NEO4J_WRITE_MAX_QUEUED cases are already
+        waiting on failed writes, in which case this case is dropped.
+        """
+        # Assigned now so the caller sees the id before the batch is written
+        case_data.setdefault("id", uuid.uuid4().hex)
+        with self._buffer_lock:
+            if len(self._buffer) >= self.settings.NEO4J_WRITE_MAX_QUEUED:
+                logger.error("Dropping case %s: %d cases are already queued", case_data["id"], len(self._buffer))
                 return False
+            self._buffer.append(case_data)
+            if len(self._buffer) < self.settings.NEO4J_WRITE_BUFFER_SIZE:
+                # Partial batches are written by a timer so a quiet period never strands a case
+                self._schedule_flush()
+                return True
+            cases = self._take_buffer()
+        return self._write_batch(cases)
     
-    def _create_case(self, tx, case_data: Dict[str, Any]):
-        """Create a case node and its relationships"""
-        query = """
-        CREATE (c:Case {
-            id: apoc.create.uuid(),
-            timestamp: datetime(),
-            symptoms: $symptoms,
-            diagnosis: $diagnosis,
-            confidence: $confidence,
-            risk_level: $risk_level
-        })
-        WITH c
-        UNWIND $symptoms as symptom
-        MERGE (s:Symptom {name: symptom})
-        CREATE (c)-[:HAS_SYMPTOM]->(s)
-        WITH c
-        UNWIND $diagnosis as diag
-        MERGE (d:Diagnosis {name: diag.name})
-        CREATE (c)-[:HAS_DIAGNOSIS {confidence: diag.confidence}]->(d)
-        RETURN c
-        """
-        
-        return tx.run(query, {
-            "symptoms": case_data["symptoms"],
-            "diagnosis": case_data["diagnosis"],
-            "confidence": case_data.get("confidence", 0.0),
-            "risk_level": case_data.get("risk_level", "unknown")
-        })
+    def flush(self) -> bool:
+        """Write all queued cases now"""
+        with self._buffer_lock:
+            cases = self._take_buffer()
+        return self._write_batch(cases) if cases else True
     
-    def find_similar_cases(self, symptoms: List[str], limit: int = 5) -> List[Dict[str, Any]]:
-        """Find similar cases based on symptoms"""
-        with self.driver.session(database=self.settings.NEO4J_DATABASE) as session:
-            return session.read_transaction(
-                self._find_similar_cases,
-                symptoms,
-                limit
-            )
+    def _write_batch(self, cases: List[Dict[str, Any]]) -> bool:
+        """Write detached cases, putting them back at the front of the queue if the write fails"""
+        if self.store_cases(cases):
+            with self._buffer_lock:
+                self._flush_delay = self.settings.NEO4J_WRITE_FLUSH_INTERVAL
+            return True
+        with self._buffer_lock:
+            self._buffer[:0] = cases
+            # Oldest cases go first so the queue stays bounded through a long outage
+            overflow = len(self._buffer) - self.settings.NEO4J_WRITE_MAX_QUEUED
+            if overflow > 0:
+                logger.error("Dropping %d queued cases after failed writes", overflow)
+                del self._buffer[:overflow]
+            self._flush_delay = min(self._flush_delay * 2, self.settings.NEO4J_WRITE_MAX_RETRY_INTERVAL)
+            if not self._closed:
+                self._schedule_flush()
+        return False
     
-    def _find_similar_cases(self, tx, symptoms: List[str], limit: int):
-        """Find similar cases using symptom overlap"""
-        query = """
-        MATCH (c:Case)-[:HAS_SYMPTOM]->(s:Symptom)
-        WHERE s.name IN $symptoms
-        WITH c, count(s) as matching_symptoms
-        MATCH (c)-[:HAS_DIAGNOSIS]->(d:Diagnosis)
-        RETURN c, collect(d) as diagnoses, matching_symptoms
-        ORDER BY matching_symptoms DESC
-        LIMIT $limit
-        """
-        
-        result = tx.run(query, {"symptoms": symptoms, "limit": limit})
-        return [dict(record) for record in result]
+    def _schedule_flush(self):
+        """Start the flush timer unless one is pending; the buffer lock must be held"""
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self._flush_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
     
-    def find_comorbidities(self, diagnosis: str) -> List[Dict[str, Any]]:
-        """Find common comorbidities for a diagnosis"""
-        with self.driver.session(database=self.settings.NEO4J_DATABASE) as session:
-            return session.read_transaction(
-                self._find_comorbidities,
-                diagnosis
-            )
+    def _take_buffer(self) -> List[Dict[str, Any]]:
+        """Detach the queued cases and cancel the pending flush; the buffer lock must be held"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        cases, self._buffer = self._buffer, []
+        return cases
     
-    def _find_comorbidities(self, tx, diagnosis: str):
-        """Find comorbidities using case co-occurrence"""
-        query = """
-        MATCH (c:Case)-[:HAS_DIAGNOSIS]->(d1:Diagnosis {name: $diagnosis})
-        MATCH (c)-[:HAS_DIAGNOSIS]->(d2:Diagnosis)
-        WHERE d1 <> d2
-        WITH d2, count(*) as co_occurrence
-        RETURN d2.name as diagnosis, co_occurrence
-        ORDER BY co_occurrence DESC
-        """
-        
-        result = tx.run(query, {"diagnosis": diagnosis})
-        return [dict(record) for record in result]
+    def store_cases(self, cases: List[Dict[str, Any]]) -> bool:
+        """Store a batch of medical cases in Neo4j"""
+        rows = [
+            {
+                # Generated client-side so no procedure call runs per row and callers see the id
+                "id": case_data.setdefault("id", uuid.uuid4().hex),
+                "symptoms": normalize_symptoms(case_data["symptoms"]),
+                "diagnosis": case_data["diagnosis"],
+                "confidence": case_data.get("confidence", 0.0),
+                "risk_level": case_data.get("risk_level", "unknown")
+            }
+            for case_data in cases
+        ]
+        try:
+            self._ensure_schema()
+            for start in range(0, len(rows), STORE_CASES_BATCH_SIZE):
+                self.driver.execute_query(
+                    STORE_CASES_QUERY,
+                    {"cases": rows[start:start + STORE_CASES_BATCH_SIZE]},
+                    database_=self.settings.NEO4J_DATABASE,
+                    routing_=RoutingControl.WRITE
+                )
+            return True
+        except Exception as e:
+            logger.error("Error storing cases: %s", e)
+            return False
+    
+    def find_similar_cases(self, symptoms: List[str], limit: int = 5) -> List[Dict[str, Any]]:
+        """Find similar cases based on symptoms"""
+        self._ensure_schema()
+        # Consume records as they arrive rather than buffering an EagerResult first
+        return self.driver.execute_query(
+            FIND_SIMILAR_CASES_QUERY,
+            {"symptoms": normalize_symptoms(symptoms), "limit": limit},
+            database_=self.settings.NEO4J_DATABASE,
+            routing_=RoutingControl.READ,
+            result_transformer_=_similar_cases
+        )
+    
+    def find_comorbidities(self, diagnosis: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Find the most common comorbidities for a diagnosis"""
+        self._ensure_schema()
+        records, _, _ = self.driver.execute_query(
+            FIND_COMORBIDITIES_QUERY,
+            {"diagnosis": diagnosis, "limit": limit},
+            database_=self.settings.NEO4J_DATABASE,
+            routing_=RoutingControl.READ
+        )
+        return [dict(record) for record in records]
     
     def get_case_statistics(self) -> Dict[str, Any]:
         """Get statistics about stored cases"""
-        with self.driver.session(database=self.settings.NEO4J_DATABASE) as session:
-            return session.read_transaction(self._get_statistics)
-    
-    def _get_statistics(self, tx):
-        """Get various statistics about the case database"""
-        query = """
-        MATCH (c:Case)
-        WITH count(c) as total_cases
-        MATCH (s:Symptom)
-        WITH total_cases, count(s) as total_symptoms
-        MATCH (d:Diagnosis)
-        WITH total_cases, total_symptoms, count(d) as total_diagnoses
-        MATCH (c:Case)-[:HAS_DIAGNOSIS]->(d:Diagnosis)
-        WITH total_cases, total_symptoms, total_diagnoses,
-             count(DISTINCT c) as cases_with_diagnosis
-        RETURN {
-            total_cases: total_cases,
-            total_symptoms: total_symptoms,
-            total_diagnoses: total_diagnoses,
-            cases_with_diagnosis: cases_with_diagnosis
-        } as stats
-        """
-        
-        result = tx.run(query)
-        return dict(result.single()["stats"])
+        self._ensure_schema()
+        records, _, _ = self.driver.execute_query(
+            CASE_STATISTICS_QUERY,
+            database_=self.settings.NEO4J_DATABASE,
+            routing_=RoutingControl.READ
+        )
+        return dict(records[0]["stats"])
     
     def close(self):
-        """Close the Neo4j driver connection"""
+        """Write any queued cases and close the Neo4j driver connection"""
+        with self._buffer_lock:
+            self._closed = True
+        if not self.flush():
+            logger.error("%d queued cases were not written before close", len(self._buffer))
+        _open_managers.discard(self)
         self.driver.close() 
\ No newline at end of file
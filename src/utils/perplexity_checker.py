@@ -1,6 +1,10 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any
 import requests
 from src.config.settings import Settings
+from src.core.llm_clients import get_async_http_client
+
+PERPLEXITY_API_URL = "https://api.perplexity.ai/chat/completions"
+PERPLEXITY_TIMEOUT_SECONDS = 30
 
 class PerplexityChecker:
     def __init__(self, settings: Settings):
@@ -8,6 +12,11 @@ class PerplexityChecker:
         self.api_key = settings.PERPLEXITY_API_KEY
         self.confidence_threshold = settings.CONFIDENCE_THRESHOLD
         
+        # Persistent session keeps the TCP+TLS connection to Perplexity alive between checks;
+        # async checks use the shared client, whose connection pool belongs to the running loop
+        self._session = requests.Session()
+        self._session.headers.update(self._headers())
+        
     def check_diagnosis(self, diagnosis: Dict[str, Any]) -> Dict[str, Any]:
         """Check a diagnosis using Perplexity Sonar"""
         if not self.api_key:
@@ -21,15 +30,27 @@ class PerplexityChecker:
         
         try:
             response = self._call_perplexity_api(query)
-            confidence_score = self._extract_confidence(response)
-            
+            return self._build_check(diagnosis, response)
+        except Exception as e:
             return {
-                "checked": True,
-                "confidence_score": confidence_score,
-                "is_reliable": confidence_score >= self.confidence_threshold,
-                "raw_response": response,
+                "checked": False,
+                "error": str(e),
                 "diagnosis": diagnosis
             }
+    
+    async def acheck_diagnosis(self, diagnosis: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of check_diagnosis"""
+        if not self.api_key:
+            return {
+                "checked": False,
+                "error": "Perplexity API key not configured"
+            }
+        
+        query = self._prepare_query(diagnosis)
+        
+        try:
+            response = await self._acall_perplexity_api(query)
+            return self._build_check(diagnosis, response)
         except Exception as e:
             return {
                 "checked": False,
@@ -37,6 +58,18 @@ class PerplexityChecker:
                 "diagnosis": diagnosis
             }
     
+    def _build_check(self, diagnosis: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the check result from a Perplexity response"""
+        confidence_score = self._extract_confidence(response)
+        
+        return {
+            "checked": True,
+            "confidence_score": confidence_score,
+            "is_reliable": confidence_score >= self.confidence_threshold,
+            "raw_response": response,
+            "diagnosis": diagnosis
+        }
+    
     def _prepare_query(self, diagnosis: Dict[str, Any]) -> str:
         """Prepare the query for Perplexity API"""
         return f"""
@@ -51,20 +84,38 @@ class PerplexityChecker:
         3. What is the confidence level in this diagnosis?
         """
     
-    def _call_perplexity_api(self, query: str) -> Dict[str, Any]:
-        """Call the Perplexity API"""
-        headers = {
+    def _headers(self) -> Dict[str, str]:
+        """Headers sent with every Perplexity request"""
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+    
+    def _payload(self, query: str) -> Dict[str, Any]:
+        """Build the chat completion request body"""
+        return {
+            "model": "sonar-medium-online",
+            "messages": [{"role": "user", "content": query}]
+        }
+    
+    def _call_perplexity_api(self, query: str) -> Dict[str, Any]:
+        """Call the Perplexity API"""
+        response = self._session.post(
+            PERPLEXITY_API_URL,
+            json=self._payload(query),
+            timeout=PERPLEXITY_TIMEOUT_SECONDS
+        )
         
-        response = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            headers=headers,
-            json={
-                "model": "sonar-medium-online",
-                "messages": [{"role": "user", "content": query}]
-            }
+        response.raise_for_status()
+        return response.json()
+    
+    async def _acall_perplexity_api(self, query: str) -> Dict[str, Any]:
+        """Async variant of _call_perplexity_api"""
+        response = await get_async_http_client().post(
+            PERPLEXITY_API_URL,
+            json=self._payload(query),
+            headers=self._headers(),
+            timeout=PERPLEXITY_TIMEOUT_SECONDS
         )
         
         response.raise_for_status()
@@ -77,4 +128,4 @@ class PerplexityChecker:
             # Assuming the response contains a confidence score
             return float(response.get("confidence", 0.0))
         except (ValueError, TypeError):
-            return 0.0 
\ No newline at end of file
+            return 0.0
@@ -1,118 +1,190 @@
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 import re
+import json
+import hashlib
+from functools import cached_property
 from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable
 from src.config.settings import Settings
+from src.utils.ttl_cache import TTLCache
+from src.core.llm_clients import get_chat_llm
+
+SANITIZE_TEMPLATE = """
+Sanitize the following medical context by removing or generalizing sensitive information.
+Sensitive conditions to handle: {sensitive_conditions}
+
+Original context:
+{context}
+
+Provide a sanitized version that:
+1. Maintains medical accuracy
+2. Removes specific sensitive conditions
+3. Uses appropriate generalizations
+4. Preserves non-sensitive information
+"""
+
+PII_PATTERNS = {
+    # The lookbehind starts a match only at the beginning of a run of local-part characters,
+    # so long unbroken words are scanned once instead of once per starting position
+    'email': r'(?<![a-zA-Z0-9._%+-])[a-zA-Z0-9._%+-]+@[a-zA-Z0-9-]+(?:\.[a-zA-Z0-9-]+)*\.[a-zA-Z]{2,}',
+    'phone': r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',
+    'ssn': r'\b\d{3}[-]?\d{2}[-]?\d{4}\b',
+    'credit_card': r'\b\d{4}[- ]?\d{4}[- ]?\d{4}[- ]?\d{4}\b',
+    'date_of_birth': r'\b(0?[1-9]|1[0-2])[/-](0?[1-9]|[12]\d|3[01])[/-]\d{4}\b'
+}
+# Single compiled alternation so the text is scanned once for every PII type
+_PII_RE = re.compile("|".join(
+    f"(?P<{pii_type}>{pattern})" for pii_type, pattern in PII_PATTERNS.items()
+))
+
+SENSITIVE_CONDITIONS = [
+    "HIV", "AIDS", "mental health", "suicide", "abuse",
+    "substance abuse", "STD", "STI", "pregnancy", "abortion",
+    "cancer", "terminal", "palliative", "hospice"
+]
+# One case-insensitive pass for all conditions; the lookahead lets overlapping
+# conditions such as "abuse" inside "substance abuse" both be found
+_SENSITIVE_RE = re.compile(
+    r"(?=\b(" + "|".join(map(re.escape, SENSITIVE_CONDITIONS)) + r")\b)",
+    re.IGNORECASE
+)
+
+def _iter_text(obj: Any) -> Iterator[str]:
+    """Yield the string keys and leaves of a nested dict/list/tuple structure"""
+    if isinstance(obj, str):
+        yield obj
+    elif isinstance(obj, dict):
+        for key, value in obj.items():
+            if isinstance(key, str):
+                yield key
+            yield from _iter_text(value)
+    elif isinstance(obj, (list, tuple, set)):
+        for item in obj:
+            yield from _iter_text(item)
 
 class SafetyCompliance:
     def __init__(self, settings: Settings):
         self.settings = settings
-        self.llm = ChatOpenAI(temperature=0, model="gpt-4", openai_api_key=settings.OPENAI_API_KEY)
         
-        # Initialize PII patterns
-        self.pii_patterns = {
-            'email': r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
-            'phone': r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',
-            'ssn': r'\b\d{3}[-]?\d{2}[-]?\d{4}\b',
-            'credit_card': r'\b\d{4}[- ]?\d{4}[- ]?\d{4}[- ]?\d{4}\b',
-            'date_of_birth': r'\b(0?[1-9]|1[0-2])[/-](0?[1-9]|[12]\d|3[01])[/-]\d{4}\b'
-        }
+        # Sanitized contexts keyed by a digest of the content, so repeated payloads skip the LLM call.
+        # The regex check itself is not cached: on the small payloads it sees, digesting costs more than scanning
+        self._sanitized_cache = TTLCache(settings.SAFETY_CACHE_MAX_SIZE, settings.SAFETY_CACHE_TTL_SECONDS)
         
-        # Initialize sensitive conditions list
-        self.sensitive_conditions = [
-            "HIV", "AIDS", "mental health", "suicide", "abuse",
-            "substance abuse", "STD", "STI", "pregnancy", "abortion",
-            "cancer", "terminal", "palliative", "hospice"
-        ]
+        # Patterns are compiled once per process, not once per instance
+        self.pii_patterns = PII_PATTERNS
+        self._pii_re = _PII_RE
+        self.sensitive_conditions = SENSITIVE_CONDITIONS
+        self._sensitive_re = _SENSITIVE_RE
+    
+    @cached_property
+    def llm(self) -> BaseChatModel:
+        """Shared chat model, only set up once sanitization actually needs it"""
+        return get_chat_llm(self.settings.OPENAI_API_KEY, "gpt-4")
+    
+    @cached_property
+    def _sanitize_chain(self) -> Runnable:
+        """Sanitization pipeline, parsed once; returns plain text and supports stream()/astream()"""
+        return (
+            PromptTemplate(input_variables=["context", "sensitive_conditions"], template=SANITIZE_TEMPLATE)
+            | self.llm
+            | StrOutputParser()
+        )
     
     def check_pii(self, text: str) -> Tuple[bool, List[str]]:
         """Check for PII in the text"""
-        found_pii = []
-        
-        for pii_type, pattern in self.pii_patterns.items():
-            matches = re.finditer(pattern, text)
-            for match in matches:
-                found_pii.append({
-                    "type": pii_type,
-                    "value": match.group(),
-                    "start": match.start(),
-                    "end": match.end()
-                })
+        found_pii = [
+            {
+                "type": match.lastgroup,
+                "value": match.group(),
+                "start": match.start(),
+                "end": match.end()
+            }
+            for match in self._pii_re.finditer(text)
+        ]
         
         return len(found_pii) > 0, found_pii
     
-    def redact_pii(self, text: str, pii_matches: List[Dict[str, Any]]) -> str:
+    def redact_pii(self, text: str, pii_matches: Optional[List[Dict[str, Any]]] = None) -> str:
         """Redact PII from text"""
-        redacted_text = text
-        for match in sorted(pii_matches, key=lambda x: x["start"], reverse=True):
-            redacted_text = (
-                redacted_text[:match["start"]] +
-                f"[REDACTED {match['type'].upper()}]" +
-                redacted_text[match["end"]:]
-            )
-        return redacted_text
+        if pii_matches is None:
+            # Scan and redact in a single pass
+            return self._pii_re.sub(lambda match: f"[REDACTED {match.lastgroup.upper()}]", text)
+        
+        # Stitch the kept text and placeholders together once instead of re-slicing per match
+        parts = []
+        position = 0
+        for match in sorted(pii_matches, key=lambda x: x["start"]):
+            parts.append(text[position:match["start"]])
+            parts.append(f"[REDACTED {match['type'].upper()}]")
+            position = max(position, match["end"])
+        parts.append(text[position:])
+        return "".join(parts)
     
     def check_sensitive_content(self, text: str) -> Tuple[bool, List[str]]:
         """Check for sensitive medical conditions"""
-        found_conditions = []
-        
-        for condition in self.sensitive_conditions:
-            if re.search(rf'\b{condition}\b', text, re.IGNORECASE):
-                found_conditions.append(condition)
+        found = {match.group(1).lower() for match in self._sensitive_re.finditer(text)}
+        found_conditions = [
+            condition for condition in self.sensitive_conditions
+            if condition.lower() in found
+        ]
         
         return len(found_conditions) > 0, found_conditions
     
+    @staticmethod
+    def _content_key(content: Any) -> str:
+        """Return a stable digest of a payload for use as a cache key"""
+        try:
+            serialized = json.dumps(content, sort_keys=True, default=str)
+        except TypeError:
+            # Keys of mixed types cannot be sorted
+            serialized = repr(content)
+        return hashlib.blake2b(serialized.encode(), digest_size=16).hexdigest()
+    
+    def _has_sensitive_content(self, content: Any) -> bool:
+        """Check a payload for sensitive conditions"""
+        # Only text can match a condition, so skip stringifying numbers and nesting
+        has_sensitive, _ = self.check_sensitive_content(" ".join(_iter_text(content)))
+        return has_sensitive
+    
     def validate_user_access(self, user_role: str, content: Dict[str, Any]) -> bool:
         """Validate if user has access to the content based on their role"""
         if user_role == "doctor":
             return True
         
         # For non-doctors, check if content contains sensitive information
-        has_sensitive, _ = self.check_sensitive_content(str(content))
-        return not has_sensitive
+        return not self._has_sensitive_content(content)
     
     def sanitize_medical_context(self, context: Dict[str, Any], user_role: str) -> Dict[str, Any]:
         """Sanitize medical context based on user role"""
         if user_role == "doctor":
             return context
         
+        # Every non-doctor role gets the same sanitized version, so it is keyed on content only
+        key = self._content_key(context)
+        cached = self._sanitized_cache.get(key)
+        if cached is not None:
+            return cached.copy()
+        
         # For non-doctors, filter out sensitive information
         sanitized_context = context.copy()
         
-        # Convert context to string for checking
-        context_str = str(context)
-        has_sensitive, sensitive_conditions = self.check_sensitive_content(context_str)
+        # Check only the text in the context; the full string form is built just for the LLM
+        has_sensitive, sensitive_conditions = self.check_sensitive_content(" ".join(_iter_text(context)))
         
         if has_sensitive:
             # Use LLM to generate a sanitized version
-            prompt = PromptTemplate(
-                input_variables=["context", "sensitive_conditions"],
-                template="""
-                Sanitize the following medical context by removing or generalizing sensitive information.
-                Sensitive conditions to handle: {sensitive_conditions}
-                
-                Original context:
-                {context}
-                
-                Provide a sanitized version that:
-                1. Maintains medical accuracy
-                2. Removes specific sensitive conditions
-                3. Uses appropriate generalizations
-                4. Preserves non-sensitive information
-                """
-            )
-            
-            sanitized_text = self.llm.predict(
-                prompt.format(
-                    context=context_str,
-                    sensitive_conditions=sensitive_conditions
-                )
-            )
+            sanitized_text = self._sanitize_chain.invoke({
+                "context": str(context),
+                "sensitive_conditions": ", ".join(sensitive_conditions)
+            })
             
             # Update the context with sanitized version
             sanitized_context["context_analysis"] = sanitized_text
         
-        return sanitized_context
+        self._sanitized_cache.set(key, sanitized_context)
+        return sanitized_context.copy()
     
     def validate_diagnosis_access(self, diagnosis: Dict[str, Any], user_role: str) -> bool:
         """Validate if user has access to the diagnosis"""
@@ -120,9 +192,7 @@ class SafetyCompliance:
             return True
         
         # For non-doctors, check if diagnosis contains sensitive information
-        diagnosis_str = str(diagnosis)
-        has_sensitive, _ = self.check_sensitive_content(diagnosis_str)
-        return not has_sensitive
+        return not self._has_sensitive_content(diagnosis)
     
     def get_access_level(self, user_role: str) -> str:
         """Get the access level for a user role"""
@@ -0,0 +1,104 @@
+from typing import Any, Hashable, List, Optional, Tuple
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.utils.ttl_cache import TTLCache
+
+class SemanticCache:
+    """In-memory cache matched by cosine similarity between text embeddings.
+
+    A lookup hits when a fresh entry in the same scope has similarity of at
+    least `threshold`. Entries expire after `ttl_seconds`, and once `maxsize`
+    entries are stored the oldest one is evicted.
+    """
+
+    def __init__(self,
+                 embeddings: Embeddings,
+                 threshold: float = 0.92,
+                 maxsize: int = 1024,
+                 ttl_seconds: float = 600):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        # Unit-length rows, one per entry, so a matrix-vector product gives every cosine similarity
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Tuple[float, Hashable, Any]] = []
+        self._lock = threading.Lock()
+        # A lookup and the update that follows a miss embed the same text only once
+        self._embedded = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+
+    async def _aembed(self, text: str) -> np.ndarray:
+        """Return the normalized embedding of a text"""
+        vector = self._embedded.get(text)
+        if vector is None:
+            vector = self._normalize(await self.embeddings.aembed_query(text))
+            self._embedded.set(text, vector)
+        return vector
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Convert an embedding into a unit-length float32 vector"""
+        vector = np.asarray(embedding, dtype="float32")
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    async def alookup(self, text: str, scope: Hashable = None) -> Optional[Any]:
+        """Return the value stored for the most similar text in this scope, if close enough"""
+        return self._lookup(await self._aembed(text), scope)
+
+    async def aupdate(self, text: str, scope: Hashable, value: Any) -> None:
+        """Store a value under a text's embedding, evicting the oldest entry if full"""
+        self._update(await self._aembed(text), scope, value)
+
+    def lookup_vector(self, embedding: List[float], scope: Hashable = None) -> Optional[Any]:
+        """Return the value stored for the most similar embedding in this scope, if close enough"""
+        return self._lookup(self._normalize(embedding), scope)
+
+    def update_vector(self, embedding: List[float], scope: Hashable, value: Any) -> None:
+        """Store a value under an already computed embedding, evicting the oldest entry if full"""
+        self._update(self._normalize(embedding), scope, value)
+
+    def _lookup(self, vector: np.ndarray, scope: Hashable) -> Optional[Any]:
+        """Return the value of the closest fresh entry in scope with similarity at least the threshold"""
+        with self._lock:
+            self._evict_expired()
+            if self._vectors is None or not self._entries:
+                return None
+            similarities = self._vectors @ vector
+            best_index, best_similarity = None, self.threshold
+            for index, (_, entry_scope, _) in enumerate(self._entries):
+                if entry_scope == scope and similarities[index] >= best_similarity:
+                    best_index, best_similarity = index, similarities[index]
+            return None if best_index is None else self._entries[best_index][2]
+
+    def _update(self, vector: np.ndarray, scope: Hashable, value: Any) -> None:
+        """Append an entry for a normalized vector and trim the oldest entries beyond maxsize"""
+        with self._lock:
+            self._evict_expired()
+            self._entries.append((time.monotonic() + self.ttl_seconds, scope, value))
+            self._vectors = vector[None, :] if self._vectors is None else np.vstack([self._vectors, vector])
+            overflow = len(self._entries) - self.maxsize
+            if overflow > 0:
+                del self._entries[:overflow]
+                self._vectors = self._vectors[overflow:]
+
+    def _evict_expired(self) -> None:
+        """Drop expired entries; entries are in insertion order, so they expire from the front"""
+        now = time.monotonic()
+        expired = 0
+        while expired < len(self._entries) and self._entries[expired][0] < now:
+            expired += 1
+        if expired:
+            del self._entries[:expired]
+            self._vectors = self._vectors[expired:]
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._vectors = None
+        self._embedded.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,7 +1,10 @@
-from typing import Dict, Any, List, Optional
-from langgraph.graph import Graph, StateGraph
-from langchain.tools import Tool
-from langchain.chat_models import ChatOpenAI
+import asyncio
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Any, List, Optional, TypedDict
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import END, StateGraph
+from langgraph.graph.state import CompiledStateGraph
+from langgraph.types import StreamWriter
 
 from src.agents.symptom_extractor import SymptomExtractor
 from src.agents.medical_knowledge_retriever import MedicalKnowledgeRetriever
@@ -12,109 +15,199 @@ from src.agents.llm_judge import LLMJudge
 from src.utils.perplexity_checker import PerplexityChecker
 from src.utils.neo4j_manager import Neo4jManager
 from src.utils.safety_compliance import SafetyCompliance
+from src.utils.llm_cache import configure_llm_cache
+from src.utils.semantic_cache import SemanticCache
+from src.core.llm_clients import get_chat_llm, get_embeddings
 from src.config.settings import Settings
 
+class WorkflowState(TypedDict, total=False):
+    """State passed between workflow nodes; each key is written by a single node"""
+    patient_input: str
+    user_role: str
+    symptoms: List[str]
+    medical_context: Dict[str, Any]
+    risk_assessment: Dict[str, Any]
+    diagnosis: Dict[str, Any]
+    alternatives: Dict[str, Any]
+    evaluation: Dict[str, Any]
+    final_recommendation: str
+    perplexity_check: Dict[str, Any]
+    requires_validation: bool
+    validation_status: Optional[bool]
+    case_queued: bool  # Queued for the next Neo4j batch write, not necessarily written yet
+    semantic_cache_hit: bool
+    input_declined: bool
+    pii_detected: bool
+    sensitive_content_detected: bool
+
+# Keys describing the current request, which a semantic cache hit must never overwrite
+REQUEST_STATE_KEYS = frozenset({"patient_input", "user_role", "pii_detected", "sensitive_content_detected"})
+
+# Inputs shorter than this carry too little information to run the agents on
+MIN_INPUT_LENGTH = 10
+
+TOO_SHORT_RECOMMENDATION = "Please describe your symptoms in more detail so they can be assessed."
+SENSITIVE_RECOMMENDATION = (
+    "Your description mentions a sensitive condition. Please discuss it directly with a "
+    "healthcare professional, who will review your case."
+)
+
 class MedicalWorkflow:
     def __init__(self, settings: Settings):
         self.settings = settings
-        self.llm = ChatOpenAI(temperature=0, model="gpt-4", openai_api_key=settings.OPENAI_API_KEY)
+        # Chat models and embeddings client shared across agents, reusing pooled connections
+        self.llm = get_chat_llm(settings.OPENAI_API_KEY, settings.AGENT_MODEL)
+        self.light_llm = get_chat_llm(settings.OPENAI_API_KEY, settings.LIGHT_AGENT_MODEL)
+        self.judge_llm = get_chat_llm(settings.OPENAI_API_KEY, settings.JUDGE_MODEL)
+        self.embeddings = get_embeddings(settings.OPENAI_API_KEY)
         
         # Initialize all agents
-        self.symptom_extractor = SymptomExtractor(settings.OPENAI_API_KEY)
-        self.medical_knowledge_retriever = MedicalKnowledgeRetriever(settings.OPENAI_API_KEY)
-        self.risk_evaluator = RiskEvaluator(settings.OPENAI_API_KEY)
-        self.diagnosis_generator = DiagnosisGenerator(settings.OPENAI_API_KEY)
-        self.alternative_generator = AlternativeExplanationGenerator(settings.OPENAI_API_KEY)
-        self.llm_judge = LLMJudge(settings.OPENAI_API_KEY)
+        self.symptom_extractor = SymptomExtractor(llm=self.light_llm)
+        self.medical_knowledge_retriever = MedicalKnowledgeRetriever(
+            settings.OPENAI_API_KEY,
+            llm=self.llm,
+            embeddings=self.embeddings,
+            context_cache=SemanticCache(
+                self.embeddings,
+                threshold=settings.CONTEXT_SEMANTIC_CACHE_THRESHOLD,
+                maxsize=settings.CONTEXT_SEMANTIC_CACHE_MAX_SIZE,
+                ttl_seconds=settings.CONTEXT_SEMANTIC_CACHE_TTL_SECONDS
+            ) if settings.CONTEXT_SEMANTIC_CACHE_ENABLED else None
+        )
+        self.risk_evaluator = RiskEvaluator(settings.OPENAI_API_KEY, llm=self.llm)
+        self.diagnosis_generator = DiagnosisGenerator(settings.OPENAI_API_KEY, llm=self.llm)
+        self.alternative_generator = AlternativeExplanationGenerator(settings.OPENAI_API_KEY, llm=self.light_llm)
+        self.llm_judge = LLMJudge(settings.OPENAI_API_KEY, llm=self.judge_llm)
         
         # Initialize utilities
         self.perplexity_checker = PerplexityChecker(settings)
         self.neo4j_manager = Neo4jManager(settings)
         self.safety_compliance = SafetyCompliance(settings)
+        # Paraphrased repeat inputs reuse the whole earlier result instead of rerunning every agent
+        self.semantic_cache = SemanticCache(
+            self.embeddings,
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            maxsize=settings.SEMANTIC_CACHE_MAX_SIZE,
+            ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS
+        ) if settings.SEMANTIC_CACHE_ENABLED else None
         
         # Create the workflow graph
         self.workflow = self._create_workflow()
     
-    def _create_workflow(self) -> Graph:
-        """Create the medical workflow graph using dict state"""
-        workflow = StateGraph(dict)
+    def _create_workflow(self) -> CompiledStateGraph:
+        """Create the medical workflow graph, running independent agent calls as parallel branches"""
+        workflow = StateGraph(WorkflowState)
         
-        # Define the nodes
-        def check_pii_and_sensitive_content(state: dict) -> dict:
+        # Define the nodes; each returns only the keys it writes, so parallel branches never conflict
+        def check_pii_and_sensitive_content(state: WorkflowState) -> WorkflowState:
+            update = {"patient_input": state.get("patient_input", "")}
             # Check for PII
-            has_pii, pii_matches = self.safety_compliance.check_pii(state.get("patient_input", ""))
+            has_pii, pii_matches = self.safety_compliance.check_pii(update["patient_input"])
             if has_pii:
-                state["patient_input"] = self.safety_compliance.redact_pii(state["patient_input"], pii_matches)
-                state["pii_detected"] = True
-            else:
-                state["pii_detected"] = False
+                update["patient_input"] = self.safety_compliance.redact_pii(update["patient_input"], pii_matches)
+            update["pii_detected"] = has_pii
             # Check for sensitive content
-            has_sensitive, _ = self.safety_compliance.check_sensitive_content(state.get("patient_input", ""))
-            state["sensitive_content_detected"] = has_sensitive
-            return state
+            has_sensitive, _ = self.safety_compliance.check_sensitive_content(update["patient_input"])
+            update["sensitive_content_detected"] = has_sensitive
+            return update
         
-        def extract_symptoms(state: dict) -> dict:
-            state["symptoms"] = self.symptom_extractor.extract_symptoms(state["patient_input"])
-            return state
+        def route_after_safety_checks(state: WorkflowState) -> str:
+            # Trivial or policy-blocked inputs skip every agent call
+            if len(state["patient_input"].strip()) < MIN_INPUT_LENGTH:
+                return "decline_input"
+            if state["sensitive_content_detected"] and state.get("user_role", "patient") == "patient":
+                return "decline_input"
+            return "lookup_semantic_cache" if self.semantic_cache is not None else "extract_symptoms"
         
-        def retrieve_medical_context(state: dict) -> dict:
-            state["medical_context"] = self.medical_knowledge_retriever.get_medical_context(state["symptoms"])
+        def decline_input(state: WorkflowState) -> WorkflowState:
+            if state["sensitive_content_detected"]:
+                return {
+                    "input_declined": True,
+                    "requires_validation": True,
+                    "final_recommendation": SENSITIVE_RECOMMENDATION
+                }
+            return {"input_declined": True, "final_recommendation": TOO_SHORT_RECOMMENDATION}
+        
+        async def lookup_semantic_cache(state: WorkflowState) -> WorkflowState:
+            # Runs after PII redaction so raw identifiers are never sent for embedding
+            cached = await self.semantic_cache.alookup(state["patient_input"], self._cache_scope(state))
+            if cached is None:
+                return {"semantic_cache_hit": False}
+            update = {key: value for key, value in cached.items() if key not in REQUEST_STATE_KEYS}
+            update.update(semantic_cache_hit=True, case_queued=False)
+            return update
+        
+        async def extract_symptoms(state: WorkflowState) -> WorkflowState:
+            return {"symptoms": await self.symptom_extractor.extract_symptoms(state["patient_input"])}
+        
+        async def retrieve_medical_context(state: WorkflowState) -> WorkflowState:
+            medical_context = await self.medical_knowledge_retriever.aget_medical_context(state["symptoms"])
             # Sanitize context based on user role
-            state["medical_context"] = self.safety_compliance.sanitize_medical_context(
-                state["medical_context"],
-                state.get("user_role", "patient")
-            )
-            return state
+            return {
+                "medical_context": self.safety_compliance.sanitize_medical_context(
+                    medical_context,
+                    state.get("user_role", "patient")
+                )
+            }
         
-        def evaluate_risk(state: dict) -> dict:
-            state["risk_assessment"] = self.risk_evaluator.evaluate_risk(
-                state["symptoms"],
-                state["medical_context"]
-            )
-            return state
+        async def evaluate_risk(state: WorkflowState) -> WorkflowState:
+            return {
+                "risk_assessment": await self.risk_evaluator.aevaluate_risk(
+                    state["symptoms"],
+                    state["medical_context"]
+                )
+            }
         
-        def generate_diagnosis(state: dict) -> dict:
-            state["diagnosis"] = self.diagnosis_generator.generate_diagnoses(
-                state["symptoms"],
-                state["medical_context"]
-            )
-            return state
+        async def generate_diagnosis(state: WorkflowState) -> WorkflowState:
+            return {
+                "diagnosis": await self.diagnosis_generator.agenerate_diagnoses(
+                    state["symptoms"],
+                    state["medical_context"]
+                )
+            }
         
-        def generate_alternatives(state: dict) -> dict:
-            state["alternatives"] = self.alternative_generator.generate_alternatives(
-                state["symptoms"],
-                state["diagnosis"]
-            )
-            return state
+        async def generate_alternatives(state: WorkflowState) -> WorkflowState:
+            return {
+                "alternatives": await self.alternative_generator.agenerate_alternatives(
+                    state["symptoms"],
+                    state["diagnosis"]
+                )
+            }
+        
+        async def evaluate_with_judge(state: WorkflowState) -> WorkflowState:
+            return {
+                "evaluation": await self.llm_judge.aevaluate_diagnosis(
+                    state["symptoms"],
+                    state["medical_context"],
+                    state["diagnosis"],
+                    state["alternatives"]
+                )
+            }
         
-        def evaluate_with_judge(state: dict) -> dict:
-            state["evaluation"] = self.llm_judge.evaluate_diagnosis(
+        async def generate_diagnosis_bundle(state: WorkflowState) -> WorkflowState:
+            # One call fills the same keys as generate_diagnosis, generate_alternatives and evaluate_with_judge
+            return await self.diagnosis_generator.agenerate_bundle(
                 state["symptoms"],
-                state["medical_context"],
-                state["diagnosis"],
-                state["alternatives"]
+                state["medical_context"]
             )
-            return state
         
-        def check_with_perplexity(state: dict) -> dict:
-            state["perplexity_check"] = self.perplexity_checker.check_diagnosis(state["diagnosis"])
-            return state
+        async def check_with_perplexity(state: WorkflowState) -> WorkflowState:
+            return {"perplexity_check": await self.perplexity_checker.acheck_diagnosis(state["diagnosis"])}
         
-        def check_validation_required(state: dict) -> dict:
+        def check_validation_required(state: WorkflowState) -> WorkflowState:
             # Doctors never require validation
             if state.get("user_role", "patient") == "doctor":
-                state["requires_validation"] = False
-                return state
-            state["requires_validation"] = False
+                return {"requires_validation": False}
+            requires_validation = False
             if not self.settings.AUTONOMOUS_MODE:
-                state["requires_validation"] = True
+                requires_validation = True
             elif state["perplexity_check"].get("confidence_score", 0) < self.settings.CONFIDENCE_THRESHOLD:
-                state["requires_validation"] = True
+                requires_validation = True
             elif state.get("sensitive_content_detected", False):
-                state["requires_validation"] = True
-            return state
+                requires_validation = True
+            return {"requires_validation": requires_validation}
         
-        def store_in_neo4j(state: dict) -> dict:
+        async def store_in_neo4j(state: WorkflowState) -> WorkflowState:
             if not state.get("requires_validation") or state.get("validation_status"):
                 # Ensure sensitive data is properly handled
                 case_data = {
@@ -125,39 +218,75 @@ class MedicalWorkflow:
                     "user_role": state.get("user_role", "patient"),
                     "sensitive_content": state.get("sensitive_content_detected", False)
                 }
-                self.neo4j_manager.store_case(case_data)
-            return state
-        
-        def generate_final_recommendation(state: dict) -> dict:
-            risk_validation = self.llm_judge.validate_risk_assessment(state["risk_assessment"])
-            state["final_recommendation"] = self.llm_judge.get_final_recommendation(
-                state["evaluation"],
-                risk_validation
-            )
-            return state
+                # The manager's driver is synchronous, so keep the write off the event loop
+                return {"case_queued": await asyncio.to_thread(self.neo4j_manager.store_case, case_data)}
+            return {"case_queued": False}
+        
+        async def generate_final_recommendation(state: WorkflowState,
+                                                config: RunnableConfig,
+                                                writer: StreamWriter) -> WorkflowState:
+            # One judge call validates the risk assessment and writes the recommendation
+            if not config.get("configurable", {}).get("stream_tokens"):
+                return {
+                    "final_recommendation": await self.llm_judge.areview_case(
+                        state["evaluation"],
+                        state["risk_assessment"]
+                    )
+                }
+            # Hand each token to the stream as it arrives instead of waiting for the full text
+            tokens = []
+            async for token in self.llm_judge.astream_review_case(state["evaluation"], state["risk_assessment"]):
+                tokens.append(token)
+                writer(token)
+            return {"final_recommendation": "".join(tokens)}
         
         # Add nodes to the graph
         workflow.add_node("check_pii_and_sensitive_content", check_pii_and_sensitive_content)
+        workflow.add_node("decline_input", decline_input)
         workflow.add_node("extract_symptoms", extract_symptoms)
         workflow.add_node("retrieve_medical_context", retrieve_medical_context)
         workflow.add_node("evaluate_risk", evaluate_risk)
-        workflow.add_node("generate_diagnosis", generate_diagnosis)
-        workflow.add_node("generate_alternatives", generate_alternatives)
-        workflow.add_node("evaluate_with_judge", evaluate_with_judge)
         workflow.add_node("check_with_perplexity", check_with_perplexity)
         workflow.add_node("check_validation_required", check_validation_required)
         workflow.add_node("store_in_neo4j", store_in_neo4j)
         workflow.add_node("generate_final_recommendation", generate_final_recommendation)
         
-        # Define the edges
-        workflow.add_edge("check_pii_and_sensitive_content", "extract_symptoms")
+        # Define the edges; a node with several outgoing edges fans out to concurrent branches
+        workflow.add_conditional_edges(
+            "check_pii_and_sensitive_content",
+            route_after_safety_checks,
+            ["decline_input", "lookup_semantic_cache", "extract_symptoms"]
+            if self.semantic_cache is not None else ["decline_input", "extract_symptoms"]
+        )
+        workflow.add_edge("decline_input", END)
+        if self.semantic_cache is not None:
+            workflow.add_node("lookup_semantic_cache", lookup_semantic_cache)
+            workflow.add_conditional_edges(
+                "lookup_semantic_cache",
+                lambda state: END if state.get("semantic_cache_hit") else "extract_symptoms",
+                ["extract_symptoms", END]
+            )
         workflow.add_edge("extract_symptoms", "retrieve_medical_context")
         workflow.add_edge("retrieve_medical_context", "evaluate_risk")
-        workflow.add_edge("evaluate_risk", "generate_diagnosis")
-        workflow.add_edge("generate_diagnosis", "generate_alternatives")
-        workflow.add_edge("generate_alternatives", "evaluate_with_judge")
-        workflow.add_edge("evaluate_with_judge", "check_with_perplexity")
-        workflow.add_edge("check_with_perplexity", "check_validation_required")
+        if self.settings.BUNDLED_DIAGNOSIS:
+            workflow.add_node("generate_diagnosis_bundle", generate_diagnosis_bundle)
+            workflow.add_edge("retrieve_medical_context", "generate_diagnosis_bundle")
+            workflow.add_edge("generate_diagnosis_bundle", "check_with_perplexity")
+            diagnosis_branch_end = "generate_diagnosis_bundle"
+        else:
+            workflow.add_node("generate_diagnosis", generate_diagnosis)
+            workflow.add_node("generate_alternatives", generate_alternatives)
+            workflow.add_node("evaluate_with_judge", evaluate_with_judge)
+            workflow.add_edge("retrieve_medical_context", "generate_diagnosis")
+            workflow.add_edge("generate_diagnosis", "generate_alternatives")
+            workflow.add_edge("generate_diagnosis", "check_with_perplexity")
+            workflow.add_edge("generate_alternatives", "evaluate_with_judge")
+            diagnosis_branch_end = "evaluate_with_judge"
+        # Fan in: wait for every branch before deciding on validation
+        workflow.add_edge(
+            ["evaluate_risk", diagnosis_branch_end, "check_with_perplexity"],
+            "check_validation_required"
+        )
         workflow.add_edge("check_validation_required", "store_in_neo4j")
         workflow.add_edge("store_in_neo4j", "generate_final_recommendation")
         
@@ -168,8 +297,35 @@ class MedicalWorkflow:
     
     def process_patient_input(self, patient_input: str, user_role: str = "patient") -> Dict[str, Any]:
         """Process patient input through the complete workflow"""
-        # Initialize the state as a dict
-        initial_state = {
+        return asyncio.run(self.aprocess_patient_input(patient_input, user_role))
+    
+    async def aprocess_patient_input(self, patient_input: str, user_role: str = "patient") -> Dict[str, Any]:
+        """Async variant of process_patient_input for callers already inside an event loop"""
+        # Run the workflow
+        final_state = await self.workflow.ainvoke(self._initial_state(patient_input, user_role))
+        await self._finish_run(final_state)
+        return final_state
+    
+    async def astream_patient_input(self, patient_input: str, user_role: str = "patient") -> AsyncIterator[Dict[str, Any]]:
+        """Stream the workflow: each node's state update, then the final recommendation token by token"""
+        final_state = self._initial_state(patient_input, user_role)
+        async for mode, chunk in self.workflow.astream(
+            final_state,
+            {"configurable": {"stream_tokens": True}},
+            stream_mode=["updates", "custom"]
+        ):
+            if mode == "custom":
+                yield {"event": "token", "data": chunk}
+                continue
+            for node, update in chunk.items():
+                final_state.update(update or {})
+                yield {"event": "update", "node": node, "data": update}
+        await self._finish_run(final_state)
+    
+    @staticmethod
+    def _initial_state(patient_input: str, user_role: str) -> WorkflowState:
+        """Build the starting state with every key present"""
+        return {
             "patient_input": patient_input,
             "user_role": user_role,
             "symptoms": [],
@@ -182,18 +338,32 @@ class MedicalWorkflow:
             "perplexity_check": {},
             "requires_validation": False,
             "validation_status": None,
+            "case_queued": False,
+            "semantic_cache_hit": False,
+            "input_declined": False,
             "pii_detected": False,
             "sensitive_content_detected": False
         }
-        # Run the workflow
-        final_state = self.workflow.invoke(initial_state)
+    
+    async def _finish_run(self, final_state: WorkflowState):
+        """Cache the result of a completed run and log the access"""
+        if (self.semantic_cache is not None
+                and not final_state.get("semantic_cache_hit")
+                and not final_state.get("input_declined")):
+            await self.semantic_cache.aupdate(
+                final_state["patient_input"], self._cache_scope(final_state), final_state
+            )
         # Log access attempt
         self.safety_compliance.log_access_attempt(
-            user_role,
+            final_state["user_role"],
             "medical_workflow",
             True
         )
-        return final_state
+    
+    @staticmethod
+    def _cache_scope(state: WorkflowState) -> tuple:
+        """Results are only shared between requests that are sanitized and validated alike"""
+        return state.get("user_role", "patient"), state.get("sensitive_content_detected", False)
     
     def validate_diagnosis(self, diagnosis_id: str, is_valid: bool, user_role: str) -> bool:
         """Validate a diagnosis (for controlled mode)"""
@@ -207,11 +377,11 @@ class MedicalWorkflow:
             return []
         return self.neo4j_manager.find_similar_cases(symptoms, limit)
     
-    def find_comorbidities(self, diagnosis: str, user_role: str) -> List[Dict[str, Any]]:
+    def find_comorbidities(self, diagnosis: str, user_role: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Find common comorbidities for a diagnosis"""
         if not self.safety_compliance.validate_user_access(user_role, {"diagnosis": diagnosis}):
             return []
-        return self.neo4j_manager.find_comorbidities(diagnosis)
+        return self.neo4j_manager.find_comorbidities(diagnosis, limit)
     
     def get_case_statistics(self, user_role: str) -> Dict[str, Any]:
         """Get statistics about stored cases"""
@@ -221,4 +391,15 @@ class MedicalWorkflow:
     
     def close(self):
         """Clean up resources"""
-        self.neo4j_manager.close() 
\ No newline at end of file
+        self.medical_knowledge_retriever.clear_cache()
+        self.neo4j_manager.close()
+
+# The compiled graph and agents hold no per-request state, so one instance serves
+# concurrent requests; usable directly as a FastAPI dependency
+@lru_cache(maxsize=1)
+def get_workflow() -> MedicalWorkflow:
+    """Return the process-wide workflow, built from environment settings on first use"""
+    settings = Settings()
+    # The response cache is process-global, so the application installs it once rather than each workflow
+    configure_llm_cache(settings)
+    return MedicalWorkflow(settings)
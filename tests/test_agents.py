@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from src.agents.diagnosis_generator import DiagnosisGenerator
+from src.agents.llm_judge import LLMJudge
+
+class TestDiagnosisBundle(unittest.TestCase):
+    def test_bundle_splits_json_response(self):
+        """Test that the fused response fills the diagnosis, alternatives and evaluation keys"""
+        llm = FakeListChatModel(responses=[
+            '{"potential_diagnoses": "cold", "alternative_explanations": "flu", "evaluation": "sound"}'
+        ])
+        result = DiagnosisGenerator("dummy_key", llm=llm).generate_bundle(["fever"], {})
+
+        self.assertEqual(result["diagnosis"]["potential_diagnoses"], "cold")
+        self.assertEqual(result["alternatives"]["alternative_explanations"], "flu")
+        self.assertEqual(result["evaluation"]["evaluation"], "sound")
+        self.assertNotIn("status", result["diagnosis"])
+
+    def test_bundle_falls_back_on_malformed_json(self):
+        """Test that a response that is not a JSON object is reported instead of raised"""
+        for response in ("Likely a common cold.", '["cold", "flu"]'):
+            with self.subTest(response=response):
+                llm = FakeListChatModel(responses=[response])
+                result = DiagnosisGenerator("dummy_key", llm=llm).generate_bundle(["fever"], {})
+
+                self.assertEqual(result["diagnosis"]["status"], "error")
+                self.assertIn("error", result["diagnosis"])
+                self.assertEqual(result["diagnosis"]["potential_diagnoses"], response)
+                self.assertIn("evaluation", result["evaluation"])
+
+class TestLLMJudgeReview(unittest.TestCase):
+    def test_review_is_a_single_call(self):
+        """Test that risk validation and the final recommendation come from one LLM call"""
+        llm = Mock()
+        llm.ainvoke = AsyncMock(return_value=AIMessage(content="Rest and stay hydrated"))
+        judge = LLMJudge("dummy_key", llm=llm)
+
+        recommendation = asyncio.run(judge.areview_case({"evaluation": "sound"}, {"risk_level": "low"}))
+
+        self.assertEqual(recommendation, "Rest and stay hydrated")
+        llm.ainvoke.assert_awaited_once()
+        prompt = llm.ainvoke.await_args.args[0][-1].content
+        self.assertIn("sound", prompt)
+        self.assertIn("low", prompt)
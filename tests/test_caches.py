@@ -0,0 +1,131 @@
+import asyncio
+import math
+import unittest
+from typing import List
+from unittest.mock import patch
+from langchain_core.embeddings import Embeddings
+from src.config.settings import Settings
+from src.utils import semantic_cache, ttl_cache
+from src.utils.semantic_cache import SemanticCache
+from src.utils.ttl_cache import TTLCache
+
+def _unit(similarity: float) -> List[float]:
+    """A 2-d unit vector whose cosine similarity with [1, 0] is the given value"""
+    return [similarity, math.sqrt(1 - similarity ** 2)]
+
+class _FixedEmbeddings(Embeddings):
+    """Embeddings that look texts up in a fixed table"""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vectors[text]
+
+class TestTTLCache(unittest.TestCase):
+    def test_hits_and_misses_are_counted(self):
+        """Test that lookups update the hit and miss counters"""
+        cache = TTLCache(maxsize=4, ttl_seconds=60)
+        cache.set("fever", "flu")
+
+        self.assertEqual(cache.get("fever"), "flu")
+        self.assertIsNone(cache.get("cough"))
+        self.assertEqual(cache.get("cough", "unknown"), "unknown")
+
+        info = cache.info()
+        self.assertEqual(info["hits"], 1)
+        self.assertEqual(info["misses"], 2)
+        self.assertAlmostEqual(info["hit_rate"], 1 / 3)
+        self.assertEqual(info["size"], 1)
+
+    def test_entries_expire_after_ttl(self):
+        """Test that an entry older than the TTL is a miss and is dropped"""
+        cache = TTLCache(maxsize=4, ttl_seconds=60)
+        with patch.object(ttl_cache.time, "monotonic", return_value=1000.0):
+            cache.set("fever", "flu")
+        with patch.object(ttl_cache.time, "monotonic", return_value=1059.0):
+            self.assertEqual(cache.get("fever"), "flu")
+        with patch.object(ttl_cache.time, "monotonic", return_value=1061.0):
+            self.assertIsNone(cache.get("fever"))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test that a full cache evicts the entry read or written longest ago"""
+        cache = TTLCache(maxsize=2, ttl_seconds=60)
+        cache.set("fever", "flu")
+        cache.set("cough", "cold")
+        cache.get("fever")
+        cache.set("rash", "measles")
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("fever"), "flu")
+        self.assertIsNone(cache.get("cough"))
+        self.assertEqual(cache.get("rash"), "measles")
+
+class TestSemanticCache(unittest.TestCase):
+    def setUp(self):
+        self.embeddings = _FixedEmbeddings({
+            "I have a fever": [1.0, 0.0],
+            "I've got a fever": _unit(0.93),
+            "I had a fever last year": _unit(0.91),
+        })
+
+    def test_lookup_hits_only_at_or_above_threshold(self):
+        """Test that a paraphrase just above the threshold hits and one just below misses"""
+        cache = SemanticCache(self.embeddings, threshold=0.92)
+
+        async def run():
+            await cache.aupdate("I have a fever", "patient", "rest")
+            return (
+                await cache.alookup("I've got a fever", "patient"),
+                await cache.alookup("I had a fever last year", "patient"),
+            )
+
+        self.assertEqual(asyncio.run(run()), ("rest", None))
+
+    def test_lookup_is_limited_to_scope(self):
+        """Test that an entry stored for one scope is not returned for another"""
+        cache = SemanticCache(self.embeddings, threshold=0.92)
+        cache.update_vector([1.0, 0.0], "patient", "rest")
+
+        self.assertEqual(cache.lookup_vector([1.0, 0.0], "patient"), "rest")
+        self.assertIsNone(cache.lookup_vector([1.0, 0.0], "doctor"))
+
+    def test_entries_expire_after_ttl(self):
+        """Test that entries past their TTL are dropped on the next lookup"""
+        cache = SemanticCache(self.embeddings, ttl_seconds=60)
+        with patch.object(semantic_cache.time, "monotonic", return_value=1000.0):
+            cache.update_vector([1.0, 0.0], None, "rest")
+        with patch.object(semantic_cache.time, "monotonic", return_value=1059.0):
+            self.assertEqual(cache.lookup_vector([1.0, 0.0]), "rest")
+        with patch.object(semantic_cache.time, "monotonic", return_value=1061.0):
+            self.assertIsNone(cache.lookup_vector([1.0, 0.0]))
+        self.assertEqual(len(cache), 0)
+
+    def test_oldest_entry_is_evicted_when_full(self):
+        """Test that storing beyond maxsize drops the oldest entry"""
+        cache = SemanticCache(self.embeddings, maxsize=2)
+        cache.update_vector([1.0, 0.0], None, "first")
+        cache.update_vector([0.0, 1.0], None, "second")
+        cache.update_vector([-1.0, 0.0], None, "third")
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.lookup_vector([1.0, 0.0]))
+        self.assertEqual(cache.lookup_vector([0.0, 1.0]), "second")
+        self.assertEqual(cache.lookup_vector([-1.0, 0.0]), "third")
+
+    def test_shared_caches_are_off_by_default(self):
+        """Test that neither semantic cache nor the global LLM cache is enabled without explicit configuration"""
+        settings = Settings(
+            OPENAI_API_KEY="dummy_key",
+            NEO4J_URI="bolt://localhost:7687",
+            NEO4J_USER="neo4j",
+            NEO4J_PASSWORD="password",
+            _env_file=None
+        )
+        self.assertFalse(settings.SEMANTIC_CACHE_ENABLED)
+        self.assertFalse(settings.CONTEXT_SEMANTIC_CACHE_ENABLED)
+        self.assertFalse(settings.LLM_CACHE_ENABLED)
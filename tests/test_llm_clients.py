@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.core.llm_clients import get_async_http_client
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open, so the client pools them between requests
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestAsyncHttpClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_client_survives_successive_event_loops(self):
+        """Test that the shared client works from each new loop asyncio.run creates"""
+        async def fetch():
+            response = await get_async_http_client().get(self.url)
+            return response.json()
+
+        # The workflow runs every request in its own loop, so pooled connections must not leak across them
+        for _ in range(3):
+            self.assertEqual(asyncio.run(fetch()), {"ok": True})
+
+    def test_connections_are_closed_with_their_loop(self):
+        """Test that a loop's pooled connections are closed when asyncio.run finishes"""
+        async def fetch():
+            client = get_async_http_client()
+            await client.get(self.url)
+            pool = await client._transport._pool()
+            return [
+                connection._connection._network_stream.get_extra_info("socket")
+                for connection in pool._pool.connections
+            ]
+
+        sockets = asyncio.run(fetch())
+        self.assertTrue(sockets)
+        self.assertTrue(all(sock.fileno() == -1 for sock in sockets))
@@ -0,0 +1,88 @@
+import asyncio
+import importlib
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from src.utils.neo4j_client import AsyncNeo4jClient
+
+KNOWN_SYMPTOMS = {"fever", "headache", "severe headache"}
+
+class FakeResult:
+    def __init__(self, records):
+        self._records = iter(records)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._records)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, **params):
+        self.driver.queries.append((query, params))
+        if "names" in params:
+            return FakeResult({"name": name} for name in params["names"] if name in KNOWN_SYMPTOMS)
+        return FakeResult([{"diagnosis": "Migraine", "confidence": 0.8, "symptom_count": len(params["symptoms"])}])
+
+class FakeDriver:
+    def __init__(self):
+        self.queries = []
+
+    def session(self):
+        return FakeSession(self)
+
+    def case_queries(self):
+        return [params for _, params in self.queries if "symptoms" in params]
+
+class TestMainModule(unittest.TestCase):
+    def test_main_imports(self):
+        """Test that the entry module resolves its imports from the package root"""
+        main = importlib.import_module("src.main")
+        self.assertTrue(callable(main.MedicalCopilot))
+
+class TestProcessInput(unittest.TestCase):
+    def run_copilot(self, text, extracted):
+        main = importlib.import_module("src.main")
+        driver = FakeDriver()
+        with patch.object(main, "SymptomIntake") as intake, \
+                patch.object(main, "SymptomExtractor") as extractor, \
+                patch.object(AsyncNeo4jClient, "connect", return_value=True), \
+                patch.object(AsyncNeo4jClient, "_schema_ready", True):
+            intake.return_value.process_multi_modal_input = AsyncMock(return_value={
+                "status": "success",
+                "results": [{"type": "text", "content": text, "status": "success"}]
+            })
+            extractor.return_value.extract_symptoms = AsyncMock(return_value={
+                "status": "success", "symptoms": extracted
+            })
+            copilot = main.MedicalCopilot()
+            copilot.neo4j_client.driver = driver
+            result = asyncio.run(copilot.process_input(text=text))
+        return result, driver
+
+    def test_prefetched_cases_are_reused(self):
+        """Test that symptoms taken verbatim from the input reuse the prefetched lookup"""
+        result, driver = self.run_copilot(
+            "I have a severe headache and fever since Monday", ["Severe headache", "fever"]
+        )
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["similar_cases"][0]["diagnosis"], "Migraine")
+        self.assertEqual(driver.case_queries(), [{"symptoms": ["fever", "severe headache"], "limit": 3}])
+
+    def test_paraphrased_symptoms_are_looked_up(self):
+        """Test that symptoms not present in the input text get their own lookup"""
+        result, driver = self.run_copilot("My head is pounding and I feel hot", ["headache", "fever"])
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(driver.case_queries()[-1], {"symptoms": ["fever", "headache"], "limit": 3})
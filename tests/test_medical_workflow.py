@@ -1,118 +1,139 @@
+import inspect
 import unittest
-from unittest.mock import Mock, patch, MagicMock
+from contextlib import ExitStack, contextmanager
+from unittest.mock import AsyncMock, Mock, patch
+import langchain_community.embeddings
+import langchain_openai
+import openai
 from src.workflow.medical_workflow import MedicalWorkflow
 from src.config.settings import Settings
+from src.agents.symptom_extractor import SymptomExtractor
+from src.agents.medical_knowledge_retriever import MedicalKnowledgeRetriever
+from src.agents.risk_evaluator import RiskEvaluator
+from src.agents.diagnosis_generator import DiagnosisGenerator
+from src.agents.alternative_explanation_generator import AlternativeExplanationGenerator
+from src.agents.llm_judge import LLMJudge
+from src.utils.perplexity_checker import PerplexityChecker
+from src.utils.neo4j_manager import Neo4jManager
 from src.utils.safety_compliance import SafetyCompliance
-import os
+
+# Mock settings with a dummy API key, validated once at import
+_DEFAULT_SETTINGS = Settings(
+    OPENAI_API_KEY="dummy_key",
+    PERPLEXITY_API_KEY="dummy_key",
+    NEO4J_URI="bolt://localhost:7687",
+    NEO4J_USER="neo4j",
+    NEO4J_PASSWORD="password",
+    AUTONOMOUS_MODE=False,
+    CONFIDENCE_THRESHOLD=0.8
+)
+
+# Canned agent and checker results, built once at import
+_MEDICAL_CONTEXT = {"common_conditions": ["flu", "cold"], "risk_factors": ["age", "immunity"], "context_analysis": "Patient shows symptoms of respiratory infection"}
+_RISK_LOW = {"risk_level": "low", "factors": ["mild symptoms", "no underlying conditions"]}
+_RISK_HIGH = {"risk_level": "high", "factors": ["severe symptoms", "underlying conditions"]}
+_DIAGNOSIS = {"primary": "common cold", "confidence": 0.85, "differential": ["flu", "allergies"]}
+_ALTERNATIVES = {"possible_conditions": ["flu", "allergies"], "explanations": ["viral infection", "seasonal allergies"]}
+_EVALUATION = {"confidence": 0.85, "explanation": "Symptoms consistent with common cold"}
+_CONFIDENT_CHECK = {"confidence_score": 0.85, "is_reliable": True}
+_LOW_CONFIDENCE_CHECK = {"confidence_score": 0.4, "is_reliable": False}
+
+# Detector results shared by the PII and sensitive-content tests
+_PII_MATCHES = (
+    {"start": 24, "end": 39, "text": "test@example.com"},
+    {"start": 52, "end": 64, "text": "123-456-7890"},
+)
+_SENSITIVE_MATCHES = (
+    {"start": 28, "end": 31, "text": "HIV"},
+    {"start": 52, "end": 61, "text": "depression"},
+)
+
+# (patient input, user role) pairs that run the full workflow and must be held for validation
+REQUIRES_VALIDATION_CASES = (
+    ("I have a fever", "invalid_role"),
+    ("I have diabetes and high blood pressure, and recently developed a persistent cough", "patient"),
+    ("I'm taking metformin for diabetes and have been experiencing side effects", "patient"),
+    ("My father had heart disease and I'm experiencing similar symptoms", "patient"),
+)
+
+def stub(owner, name, value):
+    """Replace a method with one that always returns value; returns what is needed to restore it"""
+    original = owner.__dict__[name]
+    if inspect.iscoroutinefunction(original):
+        async def method(self, *args, **kwargs):
+            return value
+    else:
+        def method(self, *args, **kwargs):
+            return value
+    setattr(owner, name, method)
+    return owner, name, original
+
+@contextmanager
+def swap(owner, name, value):
+    """Within the block, replace a method with one that always returns value"""
+    owner, name, original = stub(owner, name, value)
+    try:
+        yield
+    finally:
+        setattr(owner, name, original)
 
 class TestMedicalWorkflow(unittest.TestCase):
-    def setUp(self):
-        # Set environment variable for OpenAI API key
-        os.environ["OPENAI_API_KEY"] = "dummy_key"
-        
-        # Create mock settings with a dummy API key
-        self.settings = Settings(
-            OPENAI_API_KEY="dummy_key",
-            PERPLEXITY_API_KEY="dummy_key",
-            NEO4J_URI="bolt://localhost:7687",
-            NEO4J_USER="neo4j",
-            NEO4J_PASSWORD="password",
-            AUTONOMOUS_MODE=False,
-            CONFIDENCE_THRESHOLD=0.8
-        )
+    @classmethod
+    def setUpClass(cls):
+        # Tests toggle fields on the workflow's settings, so keep the module default untouched
+        cls.settings = _DEFAULT_SETTINGS.model_copy()
+
+        # Patches are started once for the whole class and stopped together in tearDownClass
+        cls._patches = ExitStack()
 
         # Mock the OpenAI client
-        self.openai_patcher = patch('openai.OpenAI')
-        self.mock_openai = self.openai_patcher.start()
-        self.mock_openai.return_value = MagicMock()
+        cls.mock_openai = cls._patches.enter_context(patch.object(openai, "OpenAI"))
+        cls.mock_openai.return_value = Mock()
 
         # Mock the ChatOpenAI class
-        self.chat_openai_patcher = patch('langchain_openai.ChatOpenAI')
-        self.mock_chat_openai = self.chat_openai_patcher.start()
-        self.mock_chat_openai.return_value = MagicMock()
+        cls.mock_chat_openai = cls._patches.enter_context(patch.object(langchain_openai, "ChatOpenAI"))
+        cls.mock_chat_openai.return_value = Mock()
 
         # Mock the OpenAIEmbeddings class
-        self.embeddings_patcher = patch('langchain_community.embeddings.OpenAIEmbeddings')
-        self.mock_embeddings = self.embeddings_patcher.start()
-        self.mock_embeddings.return_value = MagicMock()
+        cls.mock_embeddings = cls._patches.enter_context(patch.object(langchain_community.embeddings, "OpenAIEmbeddings"))
+        cls.mock_embeddings.return_value = Mock()
 
-        # Patch agent methods before workflow instantiation
-        self.patcher_symptom = patch('src.agents.symptom_extractor.SymptomExtractor.extract_symptoms', 
-            Mock(return_value=["fever", "cough", "fatigue"]))
-        self.patcher_medical = patch('src.agents.medical_knowledge_retriever.MedicalKnowledgeRetriever.get_medical_context', 
-            Mock(return_value={"common_conditions": ["flu", "cold"], "risk_factors": ["age", "immunity"], "context_analysis": "Patient shows symptoms of respiratory infection"}))
-        self.patcher_risk = patch('src.agents.risk_evaluator.RiskEvaluator.evaluate_risk', 
-            Mock(return_value={"risk_level": "low", "factors": ["mild symptoms", "no underlying conditions"]}))
-        self.patcher_diag = patch('src.agents.diagnosis_generator.DiagnosisGenerator.generate_diagnoses', 
-            Mock(return_value={"primary": "common cold", "confidence": 0.85, "differential": ["flu", "allergies"]}))
-        self.patcher_alt = patch('src.agents.alternative_explanation_generator.AlternativeExplanationGenerator.generate_alternatives', 
-            Mock(return_value={"possible_conditions": ["flu", "allergies"], "explanations": ["viral infection", "seasonal allergies"]}))
-        self.patcher_judge_eval = patch('src.agents.llm_judge.LLMJudge.evaluate_diagnosis', 
-            Mock(return_value={"confidence": 0.85, "explanation": "Symptoms consistent with common cold"}))
-        self.patcher_judge_val = patch('src.agents.llm_judge.LLMJudge.validate_risk_assessment', 
-            Mock(return_value=True))
-        self.patcher_judge_final = patch('src.agents.llm_judge.LLMJudge.get_final_recommendation', 
-            Mock(return_value="Rest and stay hydrated"))
-        self.patcher_perplexity = patch('src.utils.perplexity_checker.PerplexityChecker.check_diagnosis', 
-            Mock(return_value={"confidence_score": 0.85, "is_reliable": True}))
-        self.patcher_neo4j_store = patch('src.utils.neo4j_manager.Neo4jManager.store_case', 
-            Mock(return_value=True))
-        self.patcher_neo4j_similar = patch('src.utils.neo4j_manager.Neo4jManager.find_similar_cases', 
-            Mock(return_value=[{"symptoms": ["fever", "cough"], "diagnosis": "cold"}]))
-        self.patcher_neo4j_comorb = patch('src.utils.neo4j_manager.Neo4jManager.find_comorbidities', 
-            Mock(return_value=[{"condition": "asthma", "frequency": 0.3}]))
-        self.patcher_neo4j_stats = patch('src.utils.neo4j_manager.Neo4jManager.get_case_statistics', 
-            Mock(return_value={"total_cases": 100, "total_symptoms": 50}))
-        self.patcher_safety = patch('src.utils.safety_compliance.SafetyCompliance.check_pii', 
-            Mock(return_value=(False, [])))
-        self.patcher_sensitive = patch('src.utils.safety_compliance.SafetyCompliance.check_sensitive_content', 
-            Mock(return_value=(False, [])))
+        # Symptom extraction stays a Mock so tests can assert on its calls
+        cls.mock_extract_symptoms = cls._patches.enter_context(patch.object(
+            SymptomExtractor, "extract_symptoms",
+            AsyncMock(return_value=["fever", "cough", "fatigue"])
+        ))
 
-        # Start all patchers
-        self.patcher_symptom.start()
-        self.patcher_medical.start()
-        self.patcher_risk.start()
-        self.patcher_diag.start()
-        self.patcher_alt.start()
-        self.patcher_judge_eval.start()
-        self.patcher_judge_val.start()
-        self.patcher_judge_final.start()
-        self.patcher_perplexity.start()
-        self.patcher_neo4j_store.start()
-        self.patcher_neo4j_similar.start()
-        self.patcher_neo4j_comorb.start()
-        self.patcher_neo4j_stats.start()
-        self.patcher_safety.start()
-        self.patcher_sensitive.start()
+        # Every other agent and utility call only needs a canned result
+        cls._stubs = [
+            stub(MedicalKnowledgeRetriever, "aget_medical_context", _MEDICAL_CONTEXT),
+            stub(RiskEvaluator, "aevaluate_risk", _RISK_LOW),
+            stub(DiagnosisGenerator, "agenerate_diagnoses", _DIAGNOSIS),
+            stub(AlternativeExplanationGenerator, "agenerate_alternatives", _ALTERNATIVES),
+            stub(LLMJudge, "aevaluate_diagnosis", _EVALUATION),
+            stub(LLMJudge, "areview_case", "Rest and stay hydrated"),
+            stub(PerplexityChecker, "acheck_diagnosis", _CONFIDENT_CHECK),
+            stub(Neo4jManager, "store_case", True),
+            stub(Neo4jManager, "find_similar_cases", [{"symptoms": ["fever", "cough"], "diagnosis": "cold"}]),
+            stub(Neo4jManager, "find_comorbidities", [{"condition": "asthma", "frequency": 0.3}]),
+            stub(Neo4jManager, "get_case_statistics", {"total_cases": 100, "total_symptoms": 50}),
+            stub(SafetyCompliance, "check_pii", (False, [])),
+            stub(SafetyCompliance, "check_sensitive_content", (False, [])),
+        ]
 
-        # Create workflow instance
-        self.workflow = MedicalWorkflow(self.settings)
+        # One workflow instance serves every test
+        cls.workflow = MedicalWorkflow(cls.settings)
     
-    def tearDown(self):
-        # Stop all patchers
-        self.patcher_symptom.stop()
-        self.patcher_medical.stop()
-        self.patcher_risk.stop()
-        self.patcher_diag.stop()
-        self.patcher_alt.stop()
-        self.patcher_judge_eval.stop()
-        self.patcher_judge_val.stop()
-        self.patcher_judge_final.stop()
-        self.patcher_perplexity.stop()
-        self.patcher_neo4j_store.stop()
-        self.patcher_neo4j_similar.stop()
-        self.patcher_neo4j_comorb.stop()
-        self.patcher_neo4j_stats.stop()
-        self.patcher_safety.stop()
-        self.patcher_sensitive.stop()
-        self.chat_openai_patcher.stop()
-        self.openai_patcher.stop()
-        self.embeddings_patcher.stop()
-        self.workflow.close()
-        
-        # Clean up environment variable
-        if "OPENAI_API_KEY" in os.environ:
-            del os.environ["OPENAI_API_KEY"]
+    @classmethod
+    def tearDownClass(cls):
+        cls.workflow.close()
+        for owner, name, original in reversed(cls._stubs):
+            setattr(owner, name, original)
+        cls._patches.close()
+    
+    def setUp(self):
+        # Call records must not carry over from earlier tests
+        self.mock_extract_symptoms.reset_mock()
     
     def test_basic_workflow_patient(self):
         """Test basic workflow with patient role"""
@@ -125,7 +146,7 @@ class TestMedicalWorkflow(unittest.TestCase):
         self.assertIn("symptoms", result)
         self.assertIn("medical_context", result)
         self.assertIn("diagnosis", result)
-        self.assertIn("final_recommendation", result)
+        self.assertEqual(result["final_recommendation"], "Rest and stay hydrated")
         
         # Verify patient-specific restrictions
         self.assertFalse(result["sensitive_content_detected"])
@@ -133,12 +154,8 @@ class TestMedicalWorkflow(unittest.TestCase):
     
     def test_workflow_with_pii(self):
         """Test workflow with PII in input"""
-        pii_matches = [
-            {"start": 24, "end": 39, "text": "test@example.com"},
-            {"start": 52, "end": 64, "text": "123-456-7890"}
-        ]
-        with patch('src.utils.safety_compliance.SafetyCompliance.check_pii', return_value=(True, pii_matches)):
-            with patch('src.utils.safety_compliance.SafetyCompliance.redact_pii', return_value="I have a fever. My email is [REDACTED] and phone is [REDACTED]"):
+        with swap(SafetyCompliance, "check_pii", (True, _PII_MATCHES)):
+            with swap(SafetyCompliance, "redact_pii", "I have a fever. My email is [REDACTED] and phone is [REDACTED]"):
                 result = self.workflow.process_patient_input(
                     "I have a fever. My email is test@example.com and phone is 123-456-7890",
                     user_role="patient"
@@ -149,11 +166,8 @@ class TestMedicalWorkflow(unittest.TestCase):
     
     def test_workflow_with_sensitive_content(self):
         """Test workflow with sensitive medical content"""
-        with patch('src.utils.safety_compliance.SafetyCompliance.check_sensitive_content', return_value=(True, [
-            {"start": 28, "end": 31, "text": "HIV"},
-            {"start": 52, "end": 61, "text": "depression"}
-        ])):
-            with patch('src.utils.safety_compliance.SafetyCompliance.sanitize_medical_context', return_value="Sanitized context"):
+        with swap(SafetyCompliance, "check_sensitive_content", (True, _SENSITIVE_MATCHES)):
+            with swap(SafetyCompliance, "sanitize_medical_context", "Sanitized context"):
                 result = self.workflow.process_patient_input(
                     "I have been diagnosed with HIV and experiencing depression",
                     user_role="patient"
@@ -163,11 +177,8 @@ class TestMedicalWorkflow(unittest.TestCase):
     
     def test_doctor_access(self):
         """Test workflow with doctor role"""
-        with patch('src.utils.safety_compliance.SafetyCompliance.check_sensitive_content', return_value=(True, [
-            {"start": 28, "end": 31, "text": "HIV"},
-            {"start": 52, "end": 61, "text": "depression"}
-        ])):
-            with patch('src.utils.safety_compliance.SafetyCompliance.sanitize_medical_context', return_value="Sanitized context"):
+        with swap(SafetyCompliance, "check_sensitive_content", (True, _SENSITIVE_MATCHES)):
+            with swap(SafetyCompliance, "sanitize_medical_context", "Sanitized context"):
                 result = self.workflow.process_patient_input(
                     "Patient reports HIV positive status and depression",
                     user_role="doctor"
@@ -223,7 +234,7 @@ class TestMedicalWorkflow(unittest.TestCase):
         self.assertIn("error", stats)
         
         # Try to access sensitive cases as patient
-        with patch('src.utils.neo4j_manager.Neo4jManager.find_similar_cases', return_value=[]):
+        with swap(Neo4jManager, "find_similar_cases", []):
             cases = self.workflow.find_similar_cases(
                 symptoms=["HIV", "depression"],
                 user_role="patient"
@@ -232,44 +243,49 @@ class TestMedicalWorkflow(unittest.TestCase):
     
     def test_autonomous_mode(self):
         """Test workflow in autonomous mode"""
-        self.settings.AUTONOMOUS_MODE = True
-        workflow = MedicalWorkflow(self.settings)
-        result = workflow.process_patient_input(
-            "I have a fever and cough",
-            user_role="patient"
-        )
+        # The workflow reads the mode on every run, so toggle it on the shared instance
+        with patch.object(self.workflow.settings, "AUTONOMOUS_MODE", True):
+            result = self.workflow.process_patient_input(
+                "I have a fever and cough",
+                user_role="patient"
+            )
         self.assertFalse(result["requires_validation"])
 
     def test_empty_input(self):
         """Test workflow with empty input"""
-        with patch('src.agents.symptom_extractor.SymptomExtractor.extract_symptoms', return_value=[]):
+        with patch.object(SymptomExtractor, "extract_symptoms", return_value=[]):
             result = self.workflow.process_patient_input("", user_role="patient")
             self.assertIn("symptoms", result)
             self.assertEqual(len(result["symptoms"]), 0)
             self.assertIn("diagnosis", result)
             self.assertIn("final_recommendation", result)
 
-    def test_invalid_user_role(self):
-        """Test workflow with invalid user role"""
-        result = self.workflow.process_patient_input(
-            "I have a fever",
-            user_role="invalid_role"
-        )
-        self.assertIn("symptoms", result)
-        self.assertTrue(result["requires_validation"])
+    def test_semantic_caches_disabled_by_default(self):
+        """Test that the default workflow builds neither semantic cache"""
+        self.assertIsNone(self.workflow.semantic_cache)
+        self.assertIsNone(self.workflow.medical_knowledge_retriever.context_cache)
+
+    def test_workflow_leaves_global_llm_cache_alone(self):
+        """Test that building a workflow does not install the process-global LLM cache"""
+        with patch("src.workflow.medical_workflow.configure_llm_cache") as configure:
+            MedicalWorkflow(self.settings.model_copy(update={"LLM_CACHE_ENABLED": True}))
+        configure.assert_not_called()
+
+    def test_trivial_input_skips_agents(self):
+        """Test that too-short input is declined without calling the agents"""
+        result = self.workflow.process_patient_input("ouch", user_role="patient")
+        self.assertTrue(result["input_declined"])
+        self.assertTrue(result["final_recommendation"])
+        self.workflow.symptom_extractor.extract_symptoms.assert_not_called()
 
     def test_high_risk_scenario(self):
         """Test workflow with high-risk symptoms"""
         # Mock risk evaluator to return high risk
-        self.patcher_risk.stop()
-        self.patcher_risk = patch('src.agents.risk_evaluator.RiskEvaluator.evaluate_risk',
-            Mock(return_value={"risk_level": "high", "factors": ["severe symptoms", "underlying conditions"]}))
-        self.patcher_risk.start()
-
-        result = self.workflow.process_patient_input(
-            "I have severe chest pain and difficulty breathing",
-            user_role="patient"
-        )
+        with swap(RiskEvaluator, "aevaluate_risk", _RISK_HIGH):
+            result = self.workflow.process_patient_input(
+                "I have severe chest pain and difficulty breathing",
+                user_role="patient"
+            )
         
         self.assertEqual(result["risk_assessment"]["risk_level"], "high")
         self.assertTrue(result["requires_validation"])
@@ -277,53 +293,22 @@ class TestMedicalWorkflow(unittest.TestCase):
     def test_low_confidence_diagnosis(self):
         """Test workflow with low confidence diagnosis"""
         # Mock perplexity checker to return low confidence
-        self.patcher_perplexity.stop()
-        self.patcher_perplexity = patch('src.utils.perplexity_checker.PerplexityChecker.check_diagnosis',
-            Mock(return_value={"confidence_score": 0.4, "is_reliable": False}))
-        self.patcher_perplexity.start()
-
-        result = self.workflow.process_patient_input(
-            "I have some unusual symptoms that are hard to describe",
-            user_role="patient"
-        )
+        with swap(PerplexityChecker, "acheck_diagnosis", _LOW_CONFIDENCE_CHECK):
+            result = self.workflow.process_patient_input(
+                "I have some unusual symptoms that are hard to describe",
+                user_role="patient"
+            )
         
         self.assertLess(result["perplexity_check"]["confidence_score"], self.settings.CONFIDENCE_THRESHOLD)
         self.assertTrue(result["requires_validation"])
 
-    def test_workflow_with_multiple_conditions(self):
-        """Test workflow with multiple medical conditions"""
-        result = self.workflow.process_patient_input(
-            "I have diabetes and high blood pressure, and recently developed a persistent cough",
-            user_role="patient"
-        )
-        
-        self.assertIn("symptoms", result)
-        self.assertIn("medical_context", result)
-        self.assertIn("risk_assessment", result)
-        self.assertTrue(result["requires_validation"])
-
-    def test_workflow_with_medication_mention(self):
-        """Test workflow with medication mentions"""
-        result = self.workflow.process_patient_input(
-            "I'm taking metformin for diabetes and have been experiencing side effects",
-            user_role="patient"
-        )
-        
-        self.assertIn("symptoms", result)
-        self.assertIn("medical_context", result)
-        self.assertTrue(result["requires_validation"])
-
-    def test_workflow_with_family_history(self):
-        """Test workflow with family medical history"""
-        result = self.workflow.process_patient_input(
-            "My father had heart disease and I'm experiencing similar symptoms",
-            user_role="patient"
-        )
-        
-        self.assertIn("symptoms", result)
-        self.assertIn("medical_context", result)
-        self.assertIn("risk_assessment", result)
-        self.assertTrue(result["requires_validation"])
-
-if __name__ == '__main__':
-    unittest.main() 
\ No newline at end of file
+    def test_requires_validation_by_default(self):
+        """Test that patient-facing runs in controlled mode require validation"""
+        for text, role in REQUIRES_VALIDATION_CASES:
+            with self.subTest(text=text, role=role):
+                result = self.workflow.process_patient_input(text, user_role=role)
+                
+                self.assertIn("symptoms", result)
+                self.assertIn("medical_context", result)
+                self.assertIn("risk_assessment", result)
+                self.assertTrue(result["requires_validation"])
@@ -0,0 +1,120 @@
+import threading
+import unittest
+from unittest.mock import Mock, patch
+from src.config.settings import Settings
+from src.utils import neo4j_client, neo4j_manager
+from src.utils.neo4j_manager import STORE_CASES_QUERY, Neo4jManager
+
+_SETTINGS = Settings(
+    OPENAI_API_KEY="dummy_key",
+    NEO4J_URI="bolt://localhost:7687",
+    NEO4J_USER="neo4j",
+    NEO4J_PASSWORD="password",
+    NEO4J_WRITE_BUFFER_SIZE=2,
+    # Long enough that only the timer test sees the timer fire
+    NEO4J_WRITE_FLUSH_INTERVAL=60
+)
+
+def _case(symptom):
+    return {"symptoms": [symptom], "diagnosis": [{"name": "cold", "confidence": 0.8}]}
+
+class TestNeo4jWriteBuffer(unittest.TestCase):
+    def setUp(self):
+        self.driver = Mock()
+        patches = [
+            patch.object(neo4j_manager.GraphDatabase, "driver", return_value=self.driver),
+            patch.object(Neo4jManager, "_schema_ready", True),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def manager(self, **overrides):
+        manager = Neo4jManager(_SETTINGS.model_copy(update=overrides))
+        self.addCleanup(manager.close)
+        return manager
+
+    def written_batches(self):
+        """The case ids of every batch sent to Neo4j, in order"""
+        return [
+            [row["id"] for row in call.args[1]["cases"]]
+            for call in self.driver.execute_query.call_args_list
+            if call.args[0] == STORE_CASES_QUERY
+        ]
+
+    def test_full_buffer_is_written_as_one_batch(self):
+        """Test that cases are queued until the buffer fills, then written together"""
+        manager = self.manager()
+        first, second = _case("fever"), _case("cough")
+
+        self.assertTrue(manager.store_case(first))
+        self.assertEqual(self.written_batches(), [])
+
+        self.assertTrue(manager.store_case(second))
+        self.assertEqual(self.written_batches(), [[first["id"], second["id"]]])
+
+    def test_partial_batch_is_written_by_timer(self):
+        """Test that a queued case is written once the flush interval passes"""
+        written = threading.Event()
+        self.driver.execute_query.side_effect = lambda *args, **kwargs: written.set()
+        manager = self.manager(NEO4J_WRITE_FLUSH_INTERVAL=0.05)
+        case = _case("fever")
+
+        self.assertTrue(manager.store_case(case))
+        self.assertTrue(written.wait(5))
+        self.assertEqual(self.written_batches(), [[case["id"]]])
+
+    def test_failed_batch_is_requeued(self):
+        """Test that a batch whose write fails stays queued and is written by the next flush"""
+        manager = self.manager()
+        first, second = _case("fever"), _case("cough")
+        self.driver.execute_query.side_effect = RuntimeError("Neo4j unavailable")
+
+        manager.store_case(first)
+        self.assertFalse(manager.store_case(second))
+
+        self.driver.execute_query.side_effect = None
+        self.assertTrue(manager.flush())
+        # The failed attempt and the retry both carry the whole batch
+        self.assertEqual(self.written_batches(), [[first["id"], second["id"]]] * 2)
+
+    def test_outage_bounds_queue_and_backs_off(self):
+        """Test that failed writes back off and cases beyond the queue limit are refused"""
+        manager = self.manager(NEO4J_WRITE_MAX_QUEUED=3, NEO4J_WRITE_MAX_RETRY_INTERVAL=240)
+        cases = [_case(symptom) for symptom in ("fever", "cough", "rash", "nausea")]
+        self.driver.execute_query.side_effect = RuntimeError("Neo4j unavailable")
+
+        with self.assertLogs(neo4j_manager.logger, "ERROR") as logs:
+            results = [manager.store_case(case) for case in cases]
+        # The second and third cases each fill the buffer and fail; the fourth finds it at its limit
+        self.assertEqual(results, [True, False, False, False])
+        self.assertIn(f"Dropping case {cases[3]['id']}", logs.output[-1])
+        self.assertEqual(manager._flush_timer.interval, 240)
+
+        self.driver.execute_query.side_effect = None
+        self.assertTrue(manager.flush())
+        self.assertEqual(self.written_batches()[-1], [case["id"] for case in cases[:3]])
+        self.assertEqual(manager._flush_delay, _SETTINGS.NEO4J_WRITE_FLUSH_INTERVAL)
+
+    def test_close_writes_queued_cases(self):
+        """Test that closing the manager writes a partial batch"""
+        manager = self.manager()
+        case = _case("fever")
+
+        manager.store_case(case)
+        manager.close()
+        self.assertEqual(self.written_batches(), [[case["id"]]])
+        self.driver.close.assert_called()
+
+    def test_failed_schema_setup_is_retried(self):
+        """Test that schema setup is only marked done once it succeeds"""
+        manager = self.manager()
+        with patch.object(Neo4jManager, "_schema_ready", False):
+            self.driver.execute_query.side_effect = RuntimeError("Neo4j unavailable")
+            with self.assertLogs(neo4j_client.logger, "ERROR"):
+                manager._ensure_schema()
+            self.assertFalse(Neo4jManager._schema_ready)
+
+            self.driver.execute_query.side_effect = None
+            manager._ensure_schema()
+            self.assertTrue(Neo4jManager._schema_ready)
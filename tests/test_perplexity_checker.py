@@ -0,0 +1,57 @@
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from src.config.settings import Settings
+from src.utils import perplexity_checker
+from src.utils.perplexity_checker import PerplexityChecker
+
+class _PerplexityHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open, so checks reuse pooled connections
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({"confidence": 0.9}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestPerplexityChecker(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _PerplexityHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls._url = patch.object(
+            perplexity_checker, "PERPLEXITY_API_URL", f"http://127.0.0.1:{cls.server.server_address[1]}/"
+        )
+        cls._url.start()
+        cls.checker = PerplexityChecker(Settings(
+            OPENAI_API_KEY="dummy_key",
+            PERPLEXITY_API_KEY="dummy_key",
+            NEO4J_URI="bolt://localhost:7687",
+            NEO4J_USER="neo4j",
+            NEO4J_PASSWORD="password",
+            CONFIDENCE_THRESHOLD=0.8
+        ))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._url.stop()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_async_check_across_event_loops(self):
+        """Test that async checks keep working when each workflow run uses a new event loop"""
+        diagnosis = {"symptoms": ["fever"], "potential_diagnoses": "common cold"}
+        for _ in range(3):
+            result = asyncio.run(self.checker.acheck_diagnosis(diagnosis))
+            self.assertTrue(result["checked"], result.get("error"))
+            self.assertTrue(result["is_reliable"])